@@ -0,0 +1,219 @@
+import os
+import select
+from .Constants import STARTING_FEN
+from .Position import Position
+from .Clock import now_ns, NS_PER_MS
+from .Engine import sanitize_input, split_reply, launch_engine, launch_pipe_engine, stop_engine, MessageBuffer, NativeProtocol, Ponder
+from .Transport import PipeConnection, listen_engine, accept_engine, close_listener
+from .Uci import UciProtocol, HANDSHAKE
+
+
+def _forfeit(is_white, reason, moves, timings):
+    return ("0-1" if is_white else "1-0", ("White " if is_white else "Black ") + reason, moves, timings)
+
+#Waits for every answer of the UCI handshake, False if the engine did not
+#give one in time
+def uci_handshake(connection, timeout):
+    buffer = MessageBuffer("newline")
+    deadline = now_ns() + timeout * 1000 * NS_PER_MS
+    for command, answer in HANDSHAKE:
+        connection.sendall((command + "\n").encode())
+        lines = []
+        while answer not in lines:
+            ready, _, _ = select.select([connection], [], [], max(deadline - now_ns(), 0) / (1000 * NS_PER_MS))
+            data = connection.recv(4096) if ready else b''
+            if data == b'':
+                return False
+            lines = [line.strip() for line in buffer.feed(data)]
+    return True
+
+def make_protocol(uci, framing = "newline", increment = 0):
+    return UciProtocol(increment) if uci else NativeProtocol(framing)
+
+#The part of a game against engines that run.py and play_game share. It
+#sends the side to move its position, handles engine replies and answers
+#bad ones with ERROR, keeps the clocks and does the pondering. Its owner
+#reads the connections and passes on what arrives with feed().
+class Arbiter:
+    def __init__(self, position, ponder = False):
+        self.position = position
+        self.ponder = ponder
+        self.connections = {}
+        self.protocols = {}
+        self.ponders = {}
+        #Moves the engines made, as they sent them
+        self.moves = []
+        #An engine has its position and has not answered yet
+        self.thinking = False
+
+    #connection needs sendall(), protocol is an Engine.NativeProtocol or a
+    #Uci.UciProtocol. A side without an engine is played on the board.
+    def add_engine(self, is_white, connection, protocol):
+        self.connections[is_white] = connection
+        self.protocols[is_white] = protocol
+        self.ponders[is_white] = Ponder()
+
+    def is_engine(self, is_white):
+        return is_white in self.connections
+
+    def send(self, is_white, messages):
+        self.connections[is_white].sendall(self.protocols[is_white].encode(messages))
+
+    #Once a move has been made, sends the position to the side to move. An
+    #engine's clock starts once its position is out, not when it was queued,
+    #a human's right away.
+    def update(self):
+        position = self.position
+        if not position.should_send_fen or position.is_game_ended():
+            return
+        position.should_send_fen = False
+        is_white = position.white_to_move
+        if not self.is_engine(is_white):
+            position.start_clock()
+            return
+        if position.print_moves:
+            print("Sending fen to " + ("white" if is_white else "black"))
+        self.thinking = True
+        queued = now_ns()
+        self.send(is_white, self.ponders[is_white].resolve(position))
+        position.start_clock(now_ns(), queued)
+
+    #data came from is_white's engine at received, the monotonic_ns time it
+    #was read. Returns how many moves it made.
+    def feed(self, is_white, data, received):
+        try:
+            messages = self.protocols[is_white].feed(data)
+        except ValueError as e:
+            self.reject(is_white, str(e))
+            return 0
+        made = 0
+        for message in messages:
+            move, ponder_move = split_reply(message)
+            if not self.handle_message(is_white, move, received):
+                self.reject(is_white, message)
+                continue
+            made += 1
+            #The opponent's position goes out first so its clock is not held
+            #up by the ponder message
+            self.update()
+            if self.ponder and not self.position.is_game_ended():
+                self.start_pondering(is_white, ponder_move)
+        return made
+
+    #The engine is charged up to received and not for however long it takes
+    #to get to the message. After a rejected move its clock goes on from
+    #received, so the time spent handling it is charged too.
+    def handle_message(self, is_white, message, received):
+        position = self.position
+        if position.print_moves:
+            print("Received message from " + ("white: " if is_white else "black: ") + message)
+        if is_white != position.white_to_move or position.is_game_ended():
+            return False
+        position.stop_clock(received)
+        move = sanitize_input(message)
+        if move == None or not position.make_move(move[0], move[1], move[2]):
+            position.start_clock(received)
+            return False
+        self.moves.append(message)
+        self.thinking = False
+        return True
+
+    def reject(self, is_white, message):
+        if self.position.print_moves:
+            print("Received illegal request by " + ("white" if is_white else "black") + "\nReceived message: " + message)
+        self.send(is_white, ["ERROR"])
+
+    #Sent to the engine that just moved, after the opponent's position is out
+    def start_pondering(self, is_white, ponder_move):
+        message = self.ponders[is_white].start(self.position, ponder_move)
+        if message == None:
+            return
+        if self.position.print_moves:
+            print("Sending ponder position to " + ("white" if is_white else "black"))
+        self.send(is_white, [message])
+
+    #Engines still pondering when the game ends are told to stop
+    def stop_pondering(self):
+        for is_white, state in self.ponders.items():
+            messages = state.cancel()
+            if messages:
+                self.send(is_white, messages)
+
+#Plays one headless game between two engine commands. By default each engine
+#gets its own port picked by the OS. With transport "unix" or "shm" it gets
+#its own socket path instead, given to it in place of the port, and with
+#"pipe" the engines are talked to over their stdin and stdout. UCI engines,
+#marked by white_uci and black_uci, always use pipes. Returns (result, reason, moves,
+#timings) where timings is the list of Clock.MoveTiming for every move
+#played. With ponder engines are sent the position they expect while the
+#opponent thinks.
+def play_game(white_command, black_command, fen = STARTING_FEN, time_left = 5*60*1000, increment = 3000, connect_timeout = 10,
+              framing = "newline", ponder = False, transport = "tcp", white_uci = False, black_uci = False):
+    if ponder and framing == "raw":
+        raise ValueError("Pondering needs newline framing, raw framing cannot tell its messages apart")
+    position = Position(fen)
+    position.print_moves = False
+    position.time_left_white = time_left
+    position.time_left_black = time_left
+    position.increment = increment
+
+    uci = {True: white_uci, False: black_uci}
+    arbiter = Arbiter(position, ponder)
+    listeners = {}
+    processes = []
+    socks = {}
+    moves = arbiter.moves
+    timings = position.clock.timings
+    try:
+        for is_white, command in ((True, white_command), (False, black_command)):
+            if uci[is_white] or transport == "pipe":
+                process = launch_pipe_engine(command)
+                processes.append(process)
+                socks[is_white] = PipeConnection(process)
+                continue
+            port = 0 if transport == "tcp" else str(os.getpid()) + ("-white" if is_white else "-black")
+            listeners[is_white], address = listen_engine(transport, port)
+            processes.append(launch_engine(command, address))
+        for is_white, listener in listeners.items():
+            try:
+                socks[is_white] = accept_engine(listener, transport, connect_timeout)
+            except OSError:
+                return _forfeit(is_white, "failed to connect", moves, timings)
+        for is_white in (True, False):
+            try:
+                if uci[is_white] and not uci_handshake(socks[is_white], connect_timeout):
+                    return _forfeit(is_white, "failed to start", moves, timings)
+            except OSError:
+                return _forfeit(is_white, "failed to start", moves, timings)
+            arbiter.add_engine(is_white, socks[is_white], make_protocol(uci[is_white], framing, increment))
+
+        while not position.is_game_ended():
+            arbiter.update()
+
+            time_left = position.clock.time_left_ns(position.white_to_move)
+            ready, _, _ = select.select(list(socks.values()), [], [], max(time_left, 0) / (1000 * NS_PER_MS))
+            received = now_ns()
+            position.tick_clock(received)
+            if position.is_game_ended():
+                break
+
+            for sock in ready:
+                is_white = sock is socks[True]
+                try:
+                    data = sock.recv(4096)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+                if data == b'':
+                    return _forfeit(is_white, "disconnected", moves, timings)
+                arbiter.feed(is_white, data, received)
+
+        return (position.get_result(), position.status, moves, timings)
+    finally:
+        for sock in socks.values():
+            sock.close()
+        for listener in listeners.values():
+            close_listener(listener)
+        for process in processes:
+            stop_engine(process)
@@ -0,0 +1,205 @@
+from .Constants import *
+from .Zobrist import PIECE_SQUARE
+
+#Squares are indexed as rank*8 + file, using the same (file, rank) coordinates
+#as Board, so index 0 is a8 and index 63 is h1.
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+NORTH = (0, -1)
+SOUTH = (0, 1)
+EAST = (1, 0)
+WEST = (-1, 0)
+NORTH_EAST = (1, -1)
+NORTH_WEST = (-1, -1)
+SOUTH_EAST = (1, 1)
+SOUTH_WEST = (-1, 1)
+
+ROOK_DIRECTIONS = [NORTH, SOUTH, EAST, WEST]
+BISHOP_DIRECTIONS = [NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST]
+KNIGHT_JUMPS = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (-1, 2), (1, -2), (-1, -2)]
+
+PIECES = [BLACK_KING, BLACK_QUEEN, BLACK_PAWN, BLACK_BISHOP, BLACK_KNIGHT, BLACK_ROOK,
+          WHITE_KING, WHITE_QUEEN, WHITE_PAWN, WHITE_BISHOP, WHITE_KNIGHT, WHITE_ROOK]
+
+
+def square(pos):
+    x, y = pos
+    return y*8 + x
+
+def position(sq):
+    return (sq & 7, sq >> 3)
+
+def within_bounds(x, y):
+    return (0 <= x <= 7) and (0 <= y <= 7)
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+def msb(bb):
+    return bb.bit_length() - 1
+
+def squares_of(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+def positions_of(bb):
+    return [(sq & 7, sq >> 3) for sq in squares_of(bb)]
+
+
+def _step_table(steps):
+    table = []
+    for sq in range(64):
+        x, y = position(sq)
+        bb = 0
+        for dx, dy in steps:
+            if within_bounds(x+dx, y+dy):
+                bb |= 1 << square((x+dx, y+dy))
+        table.append(bb)
+    return table
+
+def _ray_table(direction):
+    table = []
+    dx, dy = direction
+    for sq in range(64):
+        x, y = position(sq)
+        bb = 0
+        x += dx
+        y += dy
+        while within_bounds(x, y):
+            bb |= 1 << square((x, y))
+            x += dx
+            y += dy
+        table.append(bb)
+    return table
+
+KNIGHT_ATTACKS = _step_table(KNIGHT_JUMPS)
+KING_ATTACKS = _step_table(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+PAWN_ATTACKS = {WHITE: _step_table([NORTH_EAST, NORTH_WEST]),
+                BLACK: _step_table([SOUTH_EAST, SOUTH_WEST])}
+RAYS = {direction: _ray_table(direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+#Directions that walk towards higher square indices find their first blocker
+#with the lowest set bit, the others with the highest one.
+_POSITIVE = {direction: direction[1] > 0 or (direction[1] == 0 and direction[0] > 0) for direction in RAYS}
+
+
+def ray_attacks(sq, occupied, direction):
+    ray = RAYS[direction][sq]
+    blockers = ray & occupied
+    if not blockers:
+        return ray
+    blocker = lsb(blockers) if _POSITIVE[direction] else msb(blockers)
+    return ray ^ RAYS[direction][blocker]
+
+def bishop_attacks(sq, occupied):
+    return ray_attacks(sq, occupied, NORTH_EAST) | ray_attacks(sq, occupied, NORTH_WEST) \
+         | ray_attacks(sq, occupied, SOUTH_EAST) | ray_attacks(sq, occupied, SOUTH_WEST)
+
+def rook_attacks(sq, occupied):
+    return ray_attacks(sq, occupied, NORTH) | ray_attacks(sq, occupied, SOUTH) \
+         | ray_attacks(sq, occupied, EAST) | ray_attacks(sq, occupied, WEST)
+
+def queen_attacks(sq, occupied):
+    return bishop_attacks(sq, occupied) | rook_attacks(sq, occupied)
+
+
+#Piece placement as one 64-bit occupancy per piece and per color, plus a
+#mailbox for O(1) lookups of what stands on a square. key is the piece part
+#of the Zobrist hash and is updated with every set_piece.
+class Bitboard:
+    def __init__(self, board = None):
+        self.pieces = {piece: 0 for piece in PIECES}
+        self.colors = {WHITE: 0, BLACK: 0}
+        self.occupied = 0
+        self.mailbox = [EMPTY] * 64
+        self.key = 0
+        if board is not None:
+            for file in range(8):
+                for rank in range(8):
+                    if board[file][rank] != EMPTY:
+                        self.set_piece((file, rank), board[file][rank])
+
+    def get_piece(self, pos):
+        return self.mailbox[square(pos)]
+
+    def set_piece(self, pos, piece):
+        sq = square(pos)
+        bit = 1 << sq
+        old = self.mailbox[sq]
+        if old != EMPTY:
+            self.pieces[old] ^= bit
+            self.colors[old & BLACK] ^= bit
+            self.occupied ^= bit
+            self.key ^= PIECE_SQUARE[old][sq]
+        if piece != EMPTY:
+            self.pieces[piece] |= bit
+            self.colors[piece & BLACK] |= bit
+            self.occupied |= bit
+            self.key ^= PIECE_SQUARE[piece][sq]
+        self.mailbox[sq] = piece
+
+    def attacks(self, sq, piece):
+        kind = piece & ~BLACK
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == KING:
+            return KING_ATTACKS[sq]
+        if kind == PAWN:
+            return PAWN_ATTACKS[piece & BLACK][sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied)
+        if kind == QUEEN:
+            return queen_attacks(sq, self.occupied)
+        return 0
+
+    #Looks outward from the square and stops at the first attacker found
+    def is_square_attacked(self, sq, by_color):
+        pieces = self.pieces
+        if KNIGHT_ATTACKS[sq] & pieces[KNIGHT + by_color]:
+            return True
+        if PAWN_ATTACKS[by_color ^ BLACK][sq] & pieces[PAWN + by_color]:
+            return True
+        if KING_ATTACKS[sq] & pieces[KING + by_color]:
+            return True
+
+        occupied = self.occupied
+        diagonal = pieces[BISHOP + by_color] | pieces[QUEEN + by_color]
+        if diagonal:
+            for direction in BISHOP_DIRECTIONS:
+                if RAYS[direction][sq] & diagonal and ray_attacks(sq, occupied, direction) & diagonal:
+                    return True
+        straight = pieces[ROOK + by_color] | pieces[QUEEN + by_color]
+        if straight:
+            for direction in ROOK_DIRECTIONS:
+                if RAYS[direction][sq] & straight and ray_attacks(sq, occupied, direction) & straight:
+                    return True
+        return False
+
+    #Pseudo-legal target squares, without castling
+    def targets(self, sq, piece, en_passant_target = (-1, -1)):
+        color = piece & BLACK
+        if piece & PAWN == 0:
+            return self.attacks(sq, piece) & ~self.colors[color]
+
+        enemies = self.colors[color ^ BLACK]
+        if en_passant_target != (-1, -1):
+            enemies |= 1 << square(en_passant_target)
+        targets = PAWN_ATTACKS[color][sq] & enemies
+
+        empty = ~self.occupied & FULL
+        if color == WHITE:
+            single = (1 << sq >> 8) & empty
+            targets |= single
+            if single and sq >> 3 == 6:
+                targets |= (1 << sq >> 16) & empty
+        else:
+            single = (1 << sq << 8) & empty
+            targets |= single
+            if single and sq >> 3 == 1:
+                targets |= (1 << sq << 16) & empty
+        return targets
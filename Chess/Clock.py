@@ -0,0 +1,96 @@
+import time
+from collections import namedtuple
+
+NS_PER_MS = 1000000
+
+#Monotonic so NTP or manual clock changes never move a player's time
+now_ns = time.monotonic_ns
+
+#Where the time of one move went, in nanoseconds. think is what the player
+#was charged (position sent until reply arrived), transport is the time spent
+#getting the position out, overhead is the arbiter's work after the reply
+#arrived until the move was applied. clock is the player's remaining time in
+#milliseconds after the move.
+MoveTiming = namedtuple("MoveTiming", ["is_white", "think", "transport", "overhead", "clock"])
+
+#Chess clock for both players. Time is kept in nanoseconds and only read off
+#when needed, so nothing is lost to rounding while it runs. Every start/stop
+#can be given the exact timestamp of the event that caused it.
+class Clock:
+    def __init__(self, time_left = 5*60*1000):
+        self.remaining = {True: time_left * NS_PER_MS, False: time_left * NS_PER_MS}
+        self.running = None     #True/False for the side whose clock runs
+        self.started = 0
+        self.turn_think = 0
+        self.turn_transport = 0
+        self.turn_stopped = None
+        self.timings = []
+
+    def is_running(self):
+        return self.running != None
+
+    #queued is when the position started being sent, at when it was out
+    def start(self, is_white, at = None, queued = None):
+        if self.running != None:
+            return
+        at = now_ns() if at == None else at
+        if queued != None:
+            self.turn_transport += max(at - queued, 0)
+        self.running = is_white
+        self.started = at
+
+    #Returns the nanoseconds charged
+    def stop(self, at = None):
+        if self.running == None:
+            return 0
+        at = now_ns() if at == None else at
+        elapsed = max(at - self.started, 0)
+        self.remaining[self.running] -= elapsed
+        self.turn_think += elapsed
+        self.turn_stopped = at
+        self.running = None
+        return elapsed
+
+    def time_left_ns(self, is_white, at = None):
+        remaining = self.remaining[is_white]
+        if self.running == is_white:
+            remaining -= (now_ns() if at == None else at) - self.started
+        return remaining
+
+    def time_left(self, is_white, at = None):
+        return self.time_left_ns(is_white, at) // NS_PER_MS
+
+    def set_time_left(self, is_white, milliseconds):
+        self.remaining[is_white] = milliseconds * NS_PER_MS
+        if self.running == is_white:
+            self.started = now_ns()
+
+    def add(self, is_white, milliseconds):
+        self.remaining[is_white] += milliseconds * NS_PER_MS
+
+    #Closes the timing record of the move is_white just made
+    def end_turn(self, is_white, at = None):
+        at = now_ns() if at == None else at
+        overhead = at - self.turn_stopped if self.turn_stopped != None else 0
+        self.timings.append(MoveTiming(is_white, self.turn_think, self.turn_transport, max(overhead, 0), self.time_left(is_white, at)))
+        self.turn_think = 0
+        self.turn_transport = 0
+        self.turn_stopped = None
+        return self.timings[-1]
+
+def _format_ms(nanoseconds):
+    return "{:0.3f}ms".format(nanoseconds / NS_PER_MS)
+
+#One line per side with totals, averages and worst cases
+def format_timings(timings):
+    lines = []
+    for is_white in (True, False):
+        moves = [timing for timing in timings if timing.is_white == is_white]
+        line = ("White" if is_white else "Black") + ": " + str(len(moves)) + " moves"
+        if moves:
+            for field in ("think", "transport", "overhead"):
+                values = [getattr(timing, field) for timing in moves]
+                line += ", " + field + " " + _format_ms(sum(values)) + " (avg " + _format_ms(sum(values) / len(values)) \
+                        + ", max " + _format_ms(max(values)) + ")"
+        lines.append(line)
+    return "\n".join(lines)
@@ -1,5 +1,3 @@
-import numpy as np
-
 BLACK = 1
 WHITE = 0
 
@@ -7,6 +5,8 @@ BLACK = 0x100
 WHITE = 0x00
 
 
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
 EMPTY = 0x1000
 KING = 0x01
 QUEEN = 0x02
@@ -67,6 +67,6 @@ pieces_from_letters = {
             'N': WHITE_KNIGHT
         }
 
-STARTING_POSITION = np.transpose(STARTING_POSITION)
+STARTING_POSITION = [list(column) for column in zip(*STARTING_POSITION)]
 
 
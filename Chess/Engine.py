@@ -0,0 +1,139 @@
+import os
+import re
+import shlex
+import subprocess
+
+pattern = re.compile("([a-h][1-8]){2}")
+
+#Turns a move like e2e4 or e7e8q into [(x1, y1), (x2, y2), promotion_piece],
+#or None if it is malformed
+def sanitize_input(input):
+    if len(input) != 4 and len(input) != 5:
+        return None
+    match = re.match(pattern, input)
+    if match == None:
+        return None
+    x1 = ord(input[0]) - ord('a')
+    y1 = 8 - int(input[1])
+    x2 = ord(input[2]) - ord('a')
+    y2 = 8 - int(input[3])
+    piece = ""
+    if len(input) == 5:
+        piece = input[4]
+        if "qnbr".count(piece) < 1:
+            return None
+    return [(x1, y1), (x2, y2), piece]
+
+#Splits an engine's reply into its move and the answer it expects from the
+#opponent, "e2e4 ponder e7e5" gives ("e2e4", "e7e5") and "e2e4" ("e2e4", None)
+def split_reply(message):
+    tokens = message.split()
+    if len(tokens) == 3 and tokens[1] == "ponder":
+        return (tokens[0], tokens[2])
+    return (message, None)
+
+#Pondering of one engine. After its move it is sent "ponder" and the position
+#after the answer it expects, to think about while the opponent's clock runs.
+#When its turn comes it gets "ponderhit" and the real position if the
+#opponent played that answer, otherwise "stop" and then the real position as
+#usual. Its clock starts once that is sent, like for any other position.
+class Ponder:
+    key = None
+
+    #Message for the engine that just moved, None if move_text is not a
+    #legal answer
+    def start(self, position, move_text):
+        move = sanitize_input(move_text) if move_text != None else None
+        ponder = position.generate_ponder_fen(move) if move != None else None
+        if ponder == None:
+            self.key = None
+            return None
+        fen, self.key = ponder
+        return "ponder " + fen
+
+    #Messages telling the engine it is to move in position
+    def resolve(self, position):
+        key, self.key = self.key, None
+        if key == None:
+            return [position.generate_fen()]
+        if key == position.zobrist_key:
+            return ["ponderhit " + position.generate_fen()]
+        return ["stop", position.generate_fen()]
+
+    #Messages ending the pondering when no move will be asked for
+    def cancel(self):
+        key, self.key = self.key, None
+        return ["stop"] if key != None else []
+
+#Starts an engine process. {port} in the command is replaced with the port
+#the engine should connect to, otherwise the port is appended as the last
+#argument.
+def launch_engine(command, port):
+    if "{port}" in command:
+        args = split_command(command.replace("{port}", str(port)))
+    else:
+        args = split_command(command) + [str(port)]
+    return subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+#Starts an engine process that talks over its stdin and stdout instead of
+#connecting to a port
+def launch_pipe_engine(command):
+    return subprocess.Popen(split_command(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+
+def split_command(command):
+    return shlex.split(command, posix=os.name != "nt")
+
+def stop_engine(process, timeout = 2):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+#Splits the byte stream from an engine into messages. With "newline" framing
+#a message ends at \n, partial messages wait in the buffer for the rest and
+#one read may hold several messages. "raw" framing treats every read as one
+#message, for engines written against the old protocol.
+class MessageBuffer:
+    def __init__(self, framing = "newline", limit = 64*1024):
+        self.framing = framing
+        self.limit = limit
+        self.buffer = b''
+
+    def feed(self, data):
+        if self.framing == "raw":
+            message = data.decode(errors="replace").strip()
+            return [message] if message else []
+
+        self.buffer += data
+        lines = self.buffer.split(b'\n')
+        self.buffer = lines.pop()
+        if len(self.buffer) > self.limit:
+            self.buffer = b''
+            raise ValueError("Message longer than " + str(self.limit) + " bytes")
+        messages = [line.decode(errors="replace").strip() for line in lines]
+        return [message for message in messages if message]
+
+def encode_message(message, framing = "newline"):
+    if framing == "newline":
+        message += "\n"
+    return message.encode()
+
+def encode_messages(messages, framing = "newline"):
+    return b"".join(encode_message(message, framing) for message in messages)
+
+#The board's own protocol, positions out and moves in as plain messages
+#framed like MessageBuffer describes. Uci.UciProtocol has the same interface.
+class NativeProtocol:
+    def __init__(self, framing = "newline"):
+        self.framing = framing
+        self.buffer = MessageBuffer(framing)
+
+    def encode(self, messages):
+        return encode_messages(messages, self.framing)
+
+    def feed(self, data):
+        return self.buffer.feed(data)
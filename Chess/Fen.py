@@ -0,0 +1,161 @@
+from collections import namedtuple
+from .Constants import *
+
+#FEN encoding and decoding. Ranks are converted through lookup tables and the
+#results are memoized per rank, since the same rank strings come up over and
+#over in a game.
+
+class FenError(ValueError):
+    pass
+
+#What each placement character stands for
+_runs = {letter: (piece,) for letter, piece in pieces_from_letters.items()}
+_runs.update({str(count): (EMPTY,) * count for count in range(1, 9)})
+
+_square_names = [chr(ord('a') + sq % 8) + str(8 - sq // 8) for sq in range(64)]
+_square_numbers = {name: sq for sq, name in enumerate(_square_names)}
+
+#Castling field for every combination of (K, Q, k, q)
+_castling_fields = {}
+for index in range(16):
+    rights = (index & 8 > 0, index & 4 > 0, index & 2 > 0, index & 1 > 0)
+    _castling_fields[rights] = "".join(letter for letter, right in zip("KQkq", rights) if right) or "-"
+_castling_rights = {field: rights for rights, field in _castling_fields.items()}
+
+#Squares the king and rook have to be on for each castling right
+_castling_squares = [(WHITE_KING, 60, WHITE_ROOK, 63), (WHITE_KING, 60, WHITE_ROOK, 56),
+                     (BLACK_KING, 4, BLACK_ROOK, 7), (BLACK_KING, 4, BLACK_ROOK, 0)]
+
+_decoded_ranks = {}
+_encoded_ranks = {}
+_rank_cache_size = 1 << 16
+
+def _remember(cache, key, value):
+    if len(cache) >= _rank_cache_size:
+        cache.clear()
+    cache[key] = value
+
+def decode_rank(text):
+    pieces = _decoded_ranks.get(text)
+    if pieces != None:
+        return pieces
+    pieces = ()
+    for i, char in enumerate(text):
+        run = _runs.get(char)
+        if run == None:
+            raise FenError("Unknown piece '" + char + "' in rank '" + text + "'")
+        if run[0] == EMPTY and i > 0 and text[i - 1].isdigit():
+            raise FenError("Two empty square counts in a row in rank '" + text + "'")
+        pieces += run
+    if len(pieces) != 8:
+        raise FenError("Rank '" + text + "' has " + str(len(pieces)) + " squares instead of 8")
+    _remember(_decoded_ranks, text, pieces)
+    return pieces
+
+#pieces is a tuple of the 8 squares of a rank
+def encode_rank(pieces):
+    text = _encoded_ranks.get(pieces)
+    if text != None:
+        return text
+    text = ""
+    empty = 0
+    for piece in pieces:
+        if piece == EMPTY:
+            empty += 1
+            continue
+        if empty > 0:
+            text += str(empty)
+            empty = 0
+        text += letters[piece]
+    if empty > 0:
+        text += str(empty)
+    _remember(_encoded_ranks, pieces, text)
+    return text
+
+def square_name(pos):
+    return "-" if pos == (-1, -1) else _square_names[pos[1] * 8 + pos[0]]
+
+#castling is (K, Q, k, q)
+def castling_field(castling):
+    return _castling_fields[castling]
+
+#mailbox is 64 squares from a8 to h1
+FenState = namedtuple("FenState", ["mailbox", "white_to_move", "castling", "en_passant_target", "halfmove_clock", "moves"])
+
+#Parses and validates a FEN. The move counters may be left out, anything
+#wrong raises FenError saying what. FENs the board wrote itself are read
+#with strict off, which drops a castling right the pieces no longer allow
+#instead of refusing the whole position.
+def decode(fen, strict = True):
+    fields = fen.split()
+    if len(fields) < 4 or len(fields) > 6:
+        raise FenError("Expected 4 to 6 fields, got " + str(len(fields)) + " in '" + fen + "'")
+    placement, side, castling, en_passant = fields[:4]
+
+    ranks = placement.split("/")
+    if len(ranks) != 8:
+        raise FenError("Expected 8 ranks, got " + str(len(ranks)) + " in '" + placement + "'")
+    mailbox = []
+    for rank in ranks:
+        mailbox += decode_rank(rank)
+    for king in (WHITE_KING, BLACK_KING):
+        if mailbox.count(king) != 1:
+            raise FenError("Expected one " + ("white" if king == WHITE_KING else "black") + " king, found " + str(mailbox.count(king)))
+    for sq in list(range(8)) + list(range(56, 64)):
+        if mailbox[sq] & PAWN > 0:
+            raise FenError("Pawn on " + _square_names[sq])
+
+    if side != "w" and side != "b":
+        raise FenError("Side to move must be 'w' or 'b', not '" + side + "'")
+
+    rights = _castling_rights.get(castling)
+    if rights == None:
+        raise FenError("Invalid castling field '" + castling + "'")
+    allowed = tuple(mailbox[king_sq] == king and mailbox[rook_sq] == rook for king, king_sq, rook, rook_sq in _castling_squares)
+    for right, is_allowed, letter in zip(rights, allowed, "KQkq"):
+        if right and not is_allowed and strict:
+            raise FenError("Castling right " + letter + " without the king and rook on their starting squares")
+    rights = tuple(right and is_allowed for right, is_allowed in zip(rights, allowed))
+
+    en_passant_target = (-1, -1)
+    if en_passant != "-":
+        sq = _square_numbers.get(en_passant)
+        if sq == None or sq // 8 != (2 if side == "w" else 5):
+            raise FenError("Invalid en passant square '" + en_passant + "' with " + side + " to move")
+        en_passant_target = (sq % 8, sq // 8)
+
+    try:
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        moves = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise FenError("Move counters must be numbers in '" + fen + "'")
+    if halfmove_clock < 0 or moves < 1:
+        raise FenError("Move counters out of range in '" + fen + "'")
+
+    return FenState(mailbox, side == "w", rights, en_passant_target, halfmove_clock, moves)
+
+def encode(placement, white_to_move, castling, en_passant_target, halfmove_clock, moves):
+    return placement + (" w " if white_to_move else " b ") + _castling_fields[castling] + " " \
+           + square_name(en_passant_target) + " " + str(halfmove_clock) + " " + str(moves)
+
+#Placement field kept up to date from a mailbox. touch() marks the rank of
+#every square that changes and only those ranks are encoded again.
+class Placement:
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+        self.ranks = [""] * 8
+        self.dirty = 0xFF
+        self.field = ""
+
+    def touch(self, rank):
+        self.dirty |= 1 << rank
+
+    def get(self):
+        if self.dirty:
+            mailbox = self.mailbox
+            for rank in range(8):
+                if self.dirty >> rank & 1:
+                    self.ranks[rank] = encode_rank(tuple(mailbox[rank*8:rank*8 + 8]))
+            self.dirty = 0
+            self.field = "/".join(self.ranks)
+        return self.field
@@ -0,0 +1,233 @@
+import datetime
+import os
+import queue
+import struct
+import threading
+import time
+from .Constants import STARTING_FEN
+from .MoveHistory import encode_move, decode_move
+from .Position import Position
+
+#Binary move log: a header, then records that each start with a type byte and
+#the game id. Every move is written as soon as the writer thread takes it off
+#its queue, so the log holds everything up to a crash. Strings are utf-8 with a 2 byte length.
+LOG_MAGIC = b"KTGL\x01"
+GAME_START = 1  #fen, white, black
+MOVE = 2        #encoded move (2 bytes), mover's clock in ms after the move (4 bytes)
+GAME_END = 3    #result index, reason
+TRUNCATE = 4    #number of moves kept (4 bytes), the game goes on from there
+
+RESULTS = ["*", "1-0", "0-1", "1/2-1/2"]
+
+_record_header = struct.Struct("<BI")
+_move_body = struct.Struct("<HI")
+_truncate_body = struct.Struct("<I")
+
+def _pack_string(text):
+    data = text.encode()
+    return struct.pack("<H", len(data)) + data
+
+def _read_string(data, offset):
+    length, = struct.unpack_from("<H", data, offset)
+    if offset + 2 + length > len(data):
+        raise IndexError("String runs past the end of the data")
+    return data[offset + 2:offset + 2 + length].decode(), offset + 2 + length
+
+#The clock left after a move as the [%clk H:MM:SS] command other PGN tools
+#read, in whole seconds
+def format_clock_comment(milliseconds):
+    seconds = max(int(milliseconds), 0) // 1000
+    return "{[%clk " + str(seconds // 3600) + ":" + str(seconds % 3600 // 60).zfill(2) + ":" + str(seconds % 60).zfill(2) + "]}"
+
+#Games in a binary log as dicts with fen, white, black, moves as
+#(move, clock) pairs, result and reason. Games cut off by a crash have
+#result "*".
+def read_log(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(LOG_MAGIC):
+        raise ValueError(path + " is not a game log")
+    games = {}
+    order = []
+    offset = len(LOG_MAGIC)
+    while offset + _record_header.size <= len(data):
+        kind, game_id = _record_header.unpack_from(data, offset)
+        offset += _record_header.size
+        try:
+            if kind == GAME_START:
+                fen, offset = _read_string(data, offset)
+                white, offset = _read_string(data, offset)
+                black, offset = _read_string(data, offset)
+                games[game_id] = {"fen": fen, "white": white, "black": black, "moves": [], "result": "*", "reason": ""}
+                order.append(game_id)
+            elif kind == MOVE:
+                code, clock = _move_body.unpack_from(data, offset)
+                offset += _move_body.size
+                games[game_id]["moves"].append((decode_move(code), clock))
+            elif kind == TRUNCATE:
+                ply, = _truncate_body.unpack_from(data, offset)
+                offset += _truncate_body.size
+                del games[game_id]["moves"][ply:]
+            elif kind == GAME_END:
+                result = RESULTS[data[offset]]
+                games[game_id]["reason"], offset = _read_string(data, offset + 1)
+                games[game_id]["result"] = result
+            else:
+                raise ValueError("Unknown record type " + str(kind) + " in " + path)
+        except (struct.error, IndexError):
+            break   #Last record cut off by a crash
+    return [games[game_id] for game_id in order]
+
+#Full PGN text of one game. moves are (move, clock) pairs.
+def format_pgn(fen, white, black, moves, result, reason = "", event = "ChessBot game", round = "-", date = None):
+    position = Position(fen)
+    position.print_moves = False
+    headers = [("Event", event), ("Site", "?"), ("Date", date or datetime.date.today().strftime("%Y.%m.%d")),
+               ("Round", round), ("White", white), ("Black", black), ("Result", result)]
+    if " ".join(fen.split()[:4]) != " ".join(STARTING_FEN.split()[:4]):
+        headers += [("SetUp", "1"), ("FEN", " ".join(fen.split()[:6]))]
+    if reason:
+        headers += [("Termination", reason)]
+    text = "".join("[" + name + " \"" + str(value).replace("\\", "\\\\").replace("\"", "\\\"") + "\"]\n" for name, value in headers)
+
+    tokens = []
+    for i, (move, clock) in enumerate(moves):
+        if position.white_to_move:
+            tokens.append(str(position.moves) + ".")
+        elif i == 0:
+            tokens.append(str(position.moves) + "...")
+        tokens += [position.get_san(move), format_clock_comment(clock)]
+        position.push(move)
+    tokens.append(result)
+
+    lines = []
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = (line + " " + token) if line else token
+    lines.append(line)
+    return text + "\n" + "\n".join(lines) + "\n\n"
+
+#Writes game records from a background thread so no file I/O happens on the
+#move path. Callers only queue events and the thread writes them in batches.
+#Each batch goes to the binary log right away, a game is added to the PGN file
+#once it ends since the PGN needs the result up front, and the PGN file is
+#flushed at most every flush_interval seconds.
+class RecordWriter:
+    def __init__(self, pgn_path = None, log_path = None, flush_interval = 1.0, batch_size = 256):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pgn_file = open(pgn_path, "a", encoding="utf-8") if pgn_path else None
+        self.log_file = None
+        #Log records of the current batch, written with one unbuffered append
+        #so other writers of the same log never split them
+        self.log_pending = bytearray()
+        if log_path:
+            try:
+                with open(log_path, "xb") as file:
+                    file.write(LOG_MAGIC)
+            except FileExistsError:
+                pass
+            self.log_file = open(log_path, "ab", buffering=0)
+        self.games = {}
+        #Random, so writers started at the same moment appending to the same
+        #log still give their games different ids
+        self.next_id = int.from_bytes(os.urandom(4), "little")
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="RecordWriter", daemon=True)
+        self.thread.start()
+
+    def start_game(self, white = "White", black = "Black", fen = STARTING_FEN, event = "ChessBot game", round = "-"):
+        with self.lock:
+            game_id = self.next_id
+            self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        self.queue.put((GAME_START, game_id, (fen, white, black, event, round, datetime.date.today().strftime("%Y.%m.%d"))))
+        return GameRecord(self, game_id)
+
+    #Records a whole game at once, moves are (move, clock) pairs
+    def write_game(self, white, black, fen, moves, result, reason = "", event = "ChessBot game", round = "-"):
+        record = self.start_game(white, black, fen, event, round)
+        for move, clock in moves:
+            record.add_move(move, clock)
+        record.end(result, reason)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        for file in (self.pgn_file, self.log_file):
+            if file != None:
+                file.close()
+
+    def _run(self):
+        dirty = False
+        last_flush = time.monotonic()
+        closing = False
+        while not closing:
+            batch = []
+            try:
+                timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0) if dirty else None
+                batch.append(self.queue.get(timeout=timeout))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            for event in batch:
+                if event == None:
+                    closing = True
+                    break
+                self._write(*event)
+                dirty = True
+            if self.log_pending:
+                self.log_file.write(self.log_pending)
+                self.log_pending = bytearray()
+            if dirty and (closing or time.monotonic() - last_flush >= self.flush_interval):
+                if self.pgn_file != None:
+                    self.pgn_file.flush()
+                dirty = False
+                last_flush = time.monotonic()
+
+    def _write(self, kind, game_id, data):
+        if kind == GAME_START:
+            fen, white, black, event, round, date = data
+            self.games[game_id] = (fen, white, black, event, round, date, [])
+            body = _pack_string(fen) + _pack_string(white) + _pack_string(black)
+        elif kind == MOVE:
+            move, clock = data
+            self.games[game_id][6].append((move, clock))
+            body = _move_body.pack(encode_move(move), max(clock, 0))
+        elif kind == TRUNCATE:
+            del self.games[game_id][6][data:]
+            body = _truncate_body.pack(data)
+        else:
+            result, reason = data
+            fen, white, black, event, round, date, moves = self.games.pop(game_id)
+            body = bytes([RESULTS.index(result) if result in RESULTS else 0]) + _pack_string(reason)
+            if self.pgn_file != None:
+                self.pgn_file.write(format_pgn(fen, white, black, moves, result, reason, event, round, date))
+        if self.log_file != None:
+            self.log_pending += _record_header.pack(kind, game_id) + body
+
+#One game being recorded, what Position.recorder expects
+class GameRecord:
+    def __init__(self, writer, game_id):
+        self.writer = writer
+        self.game_id = game_id
+        self.ended = False
+
+    def add_move(self, move, clock):
+        self.writer.queue.put((MOVE, self.game_id, (move, clock)))
+
+    #Drops every move after the first ply ones, for a game that went back in
+    #its history and took another line
+    def truncate(self, ply):
+        self.writer.queue.put((TRUNCATE, self.game_id, ply))
+
+    def end(self, result, reason = ""):
+        if self.ended:
+            return
+        self.ended = True
+        self.writer.queue.put((GAME_END, self.game_id, (result, reason)))
@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+#Bounded least-recently-used cache keyed on Position.zobrist_key
+class MoveCache:
+    def __init__(self, max_size = 4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups > 0 else 0
+        return "Move cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses (" \
+               + "{:0.1f}".format(hit_rate) + "%), " + str(len(self.entries)) + "/" + str(self.max_size) + " positions"
@@ -1,11 +1,9 @@
-from .Constants import *
-#Linked list for IT class (Forgive me lads)
+from array import array
+from . import Fen
 
-#Linked List node
+#Parsed FEN, what Position loads from
 class BoardState:
     fen = ""
-    nextState = None
-    prevState = None
 
     white_to_move = True
     board = []
@@ -18,67 +16,69 @@ class BoardState:
     moves = 0
     halfmove_clock = 0
     
-    def __init__(self, fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", prevState = None, nextState = None, prev_move = [(-1, -1), (-1, -1)]):
-        self.nextState = nextState
-        self.prevState = prevState
+    #strict is for Fen.decode, off for the board's own checkpoints
+    def __init__(self, fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", prev_move = [(-1, -1), (-1, -1)], strict = True):
         self.prev_move = prev_move
         self.fen = fen
-        self.parse_fen()
+        self.parse_fen(strict)
     
-    def parse_fen(self):
-        board = []
-        parts = self.fen.split()
+    def parse_fen(self, strict = True):
+        state = Fen.decode(self.fen, strict)
+        self.board = [state.mailbox[file::8] for file in range(8)]
+        self.white_to_move = state.white_to_move
+        self.can_castle_king_white, self.can_castle_queen_white, self.can_castle_king_black, self.can_castle_queen_black = state.castling
+        self.en_passant_target = state.en_passant_target
+        self.halfmove_clock = state.halfmove_clock
+        self.moves = state.moves
 
-        fen_rows = parts[0].split('/')
-        for row in fen_rows:
-            pieces = []
-            for char in row:
-                if char.isdigit():
-                    for i in range(int(char)):
-                        pieces.append(EMPTY)
-                else:
-                    pieces.append(pieces_from_letters[char])
-            board += [pieces]
-        self.board = np.transpose(board)
+PROMOTIONS = ["", "q", "r", "b", "n"]
 
-        self.white_to_move = parts[1] == "w"
-        self.can_castle_king_white = "K" in parts[2]
-        self.can_castle_queen_white = "Q" in parts[2]
-        self.can_castle_king_black = "k" in parts[2]
-        self.can_castle_queen_black = "q" in parts[2]
-        
-        if parts[3] == "-":
-            self.en_passant_target = (-1, -1)
-        else:
-            file = ord(parts[3][0])-ord('a')
-            rank = 8 - int(parts[3][1])
-            self.en_passant_target = (file, rank)
-        self.halfmove_clock = int(parts[4])
-        self.moves = int(parts[5])
-    
+#A move fits in 15 bits: from square, to square and promotion piece
+def encode_move(move):
+    (x1, y1), (x2, y2), promotion_piece = move
+    return (y1*8 + x1) | (y2*8 + x2) << 6 | PROMOTIONS.index(promotion_piece.lower()) << 12
+
+def decode_move(code):
+    from_sq = code & 63
+    to_sq = code >> 6 & 63
+    return ((from_sq & 7, from_sq >> 3), (to_sq & 7, to_sq >> 3), PROMOTIONS[code >> 12])
+
+#Moves of a game as 2 bytes each and the Zobrist key of every position as 8,
+#plus the FEN of every checkpoint_interval-th ply. Any ply can be rebuilt by
+#loading the checkpoint below it and replaying at most checkpoint_interval
+#moves. ply is the position currently looked at.
 class MoveHistory:
-    current_state = BoardState()
+    def __init__(self, starting_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", starting_key = 0, checkpoint_interval = 32):
+        self.checkpoint_interval = checkpoint_interval
+        self.moves = array('H')
+        self.keys = array('Q', [starting_key])
+        self.checkpoints = [starting_fen]
+        self.ply = 0
 
-    def __init__(self, starting_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"):
-        self.current_state = BoardState(starting_fen)
+    def __len__(self):
+        return len(self.moves)
     def has_next(self):
-        return self.current_state.nextState != None
+        return self.ply < len(self.moves)
     def has_prev(self):
-        return self.current_state.prevState != None
-    def move_next(self):
-        if self.has_next():
-            self.current_state = self.current_state.nextState
-        return self
-    def move_prev(self):
-        if self.has_prev():
-            self.current_state = self.current_state.prevState
-        return self
-    def get_state(self):
-        return self.current_state
-    def add(self, fen, prev_move = [(-1, -1), (-1, -1)]):
-        next = BoardState(fen=fen, prevState=self.current_state, prev_move=prev_move)
-        self.current_state.nextState = next
-        return self
-
-
+        return self.ply > 0
+    #The move played from the position at ply
+    def get_move(self, ply):
+        return decode_move(self.moves[ply])
+    #(ply, fen) of the last checkpoint at or before ply
+    def get_checkpoint(self, ply):
+        index = ply // self.checkpoint_interval
+        return index * self.checkpoint_interval, self.checkpoints[index]
 
+    #Adds a move played from the current ply, key and fen are of the position
+    #it leads to. Moves after the current ply are dropped, so playing a move
+    #while looking at an earlier position starts a new line from there.
+    def add(self, move, key, fen):
+        del self.moves[self.ply:]
+        del self.keys[self.ply + 1:]
+        del self.checkpoints[self.ply // self.checkpoint_interval + 1:]
+        self.moves.append(encode_move(move))
+        self.keys.append(key)
+        self.ply += 1
+        if self.ply % self.checkpoint_interval == 0:
+            self.checkpoints.append(fen)
+        return self
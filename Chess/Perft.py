@@ -0,0 +1,67 @@
+import time
+from multiprocessing import Pool
+from .Constants import STARTING_FEN
+from .Position import Position
+
+#Reference positions and their known node counts for depths 1, 2, 3...
+REFERENCE_POSITIONS = [
+    ("Start position", STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def format_move(move):
+    (x1, y1), (x2, y2), promotion_piece = move
+    return chr(ord('a') + x1) + str(8 - y1) + chr(ord('a') + x2) + str(8 - y2) + promotion_piece
+
+def perft(board, depth):
+    if depth == 0:
+        return 1
+    moves = board.get_legal_moves(cached=False)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+def _perft_after_move(args):
+    fen, move, depth = args
+    board = Position(fen)
+    board.push(move)
+    return perft(board, depth)
+
+#Node count below every root move, optionally fanned out over worker processes
+def divide(fen, depth, processes = 1):
+    board = Position(fen)
+    moves = board.get_legal_moves()
+    if depth <= 1:
+        return [(move, 1) for move in moves]
+    jobs = [(fen, move, depth - 1) for move in moves]
+    if processes > 1:
+        with Pool(processes) as pool:
+            counts = pool.map(_perft_after_move, jobs)
+    else:
+        counts = [_perft_after_move(job) for job in jobs]
+    return list(zip(moves, counts))
+
+#Returns (nodes, seconds)
+def run_perft(fen, depth, processes = 1):
+    start = time.perf_counter()
+    if processes > 1 and depth > 1:
+        nodes = sum(count for _, count in divide(fen, depth, processes))
+    else:
+        nodes = perft(Position(fen), depth)
+    return nodes, time.perf_counter() - start
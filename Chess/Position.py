@@ -0,0 +1,638 @@
+from .Constants import *
+from .Bitboard import Bitboard, square, positions_of, squares_of, lsb, PAWN_ATTACKS
+from .Zobrist import state_key
+from .MoveHistory import BoardState, MoveHistory
+from .MoveCache import MoveCache
+from .Clock import Clock
+from . import Fen
+
+#Game state and rules, with no graphics dependencies
+class Position:
+    status = "Begin"
+    should_send_fen = True
+    print_moves = True
+
+    white_victory = False
+    white_to_move = True
+    clock_win = False
+    draw_insufficient_material = False
+    checkmate = False
+    stalemate = False
+    moves = 1
+    halfmove_clock = 0
+
+    can_castle_queen_black = True
+    can_castle_queen_white = True
+    can_castle_king_black = True
+    can_castle_king_white = True
+    en_passant_target = (-1, -1)
+    prev_move = [(-1, -1), (-1, -1)]
+    undo_stack = []
+    #History ply of the position undo_stack starts from
+    undo_base = 0
+    #Zobrist key of the current position, also the cache key for anything
+    #memoized per position
+    zobrist_key = 0
+    #FEN placement field, re-encoded only for ranks that changed
+    placement = None
+
+    increment = 3000            #milliseconds
+    clock = None
+
+    history = None
+    move_cache = None
+    #Receives add_move(move, clock) for every move made, see GameRecord
+    recorder = None
+
+    def __init__(self, default_pos = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", move_cache_size = 4096):
+        self.move_cache = MoveCache(move_cache_size)
+        self.clock = Clock()
+        self.load_from_state(BoardState(default_pos))
+        self.history = MoveHistory(default_pos, self.zobrist_key)
+
+    def is_game_ended(self):
+        return self.clock_win or self.checkmate or self.stalemate or self.draw_insufficient_material
+
+    def get_result(self):
+        if self.clock_win:
+            return "1-0" if self.white_victory else "0-1"
+        if self.checkmate:
+            return "0-1" if self.white_to_move else "1-0"
+        if self.stalemate or self.draw_insufficient_material:
+            return "1/2-1/2"
+        return "*"
+
+    #Remaining time in milliseconds, read live from the clock
+    @property
+    def time_left_white(self):
+        return self.clock.time_left(True)
+
+    @time_left_white.setter
+    def time_left_white(self, milliseconds):
+        self.clock.set_time_left(True, milliseconds)
+
+    @property
+    def time_left_black(self):
+        return self.clock.time_left(False)
+
+    @time_left_black.setter
+    def time_left_black(self, milliseconds):
+        self.clock.set_time_left(False, milliseconds)
+
+    @property
+    def is_clock_ticking(self):
+        return self.clock.is_running()
+
+    #at and queued are monotonic_ns timestamps of when the position was sent
+    #and when sending started, None means now
+    def start_clock(self, at = None, queued = None):
+        self.clock.start(self.white_to_move, at, queued)
+
+    #at is the monotonic_ns timestamp to flag against, None means now
+    def tick_clock(self, at = None):
+        self.check_for_clock_win(at)
+
+    def count_material(self, is_white):
+        material = {'k':0, 'n':0, 'b':0, 'r':0, 'p':0, 'q':0}
+        for file in range(8):
+            for rank in range(8):
+                piece = self.get_piece((file, rank))
+                if piece == EMPTY or (piece & BLACK == 0) == is_white:
+                    continue
+                material[letters[piece].lower()] += 1
+        return material
+
+    def is_sufficient_material(self, is_white):
+        material = self.count_material(is_white)
+        return material['p'] > 0 or material['r'] > 0 or material['q'] > 0 or material['b'] > 1 or (material['n'] > 0 and material['b'] > 0) or material['n'] > 1
+
+    #The clock is stopped where the flag fell before the loser's time is set
+    #to 0, so it is not left running below 0
+    def check_for_clock_win(self, at = None):
+        if self.clock.time_left_ns(True, at) <= 0:
+            self.stop_clock(at)
+            sufficient = self.is_sufficient_material(False)
+            if not sufficient:
+                self.draw_insufficient_material = True
+                self.time_left_white = 0
+            else:
+                self.clock_win = True
+                self.time_left_white = 0
+        elif self.clock.time_left_ns(False, at) <= 0:
+            self.stop_clock(at)
+            sufficient = self.is_sufficient_material(True)
+            if not sufficient:
+                self.draw_insufficient_material = True
+                self.time_left_black = 0
+            else:
+                self.clock_win = True
+                self.white_victory = True
+                self.time_left_black = 0
+
+
+        if self.clock_win:
+            self.stop_clock()
+            self.status = ("White" if self.white_victory else "Black") + " win by timeout"
+        if self.draw_insufficient_material:
+            self.stop_clock()
+            self.status = "Insufficient mating material"
+
+    #at is the monotonic_ns timestamp of the reply, None means now
+    def stop_clock(self, at = None):
+        self.clock.stop(at)
+
+    def add_increment(self):
+        self.clock.add(self.white_to_move, self.increment)
+
+    def get_piece(self, pos):
+        return self.bitboard.get_piece(pos)
+
+    def set_piece(self, pos, piece):
+        self.bitboard.set_piece(pos, piece)
+        self.placement.touch(pos[1])
+
+    #Legal moves of the side to move come from the move cache, the returned
+    #list is shared and must not be modified
+    def get_possible_moves(self, frompos, checks = True):
+        piece = self.get_piece(frompos)
+        if checks and piece != EMPTY and self.is_piece_white(piece) == self.white_to_move:
+            return self.get_legal_move_map().get(frompos, [])
+        return self.generate_possible_moves(frompos, checks)
+
+    #Full legal move list of the side to move as {from_pos: [to_pos, ...]},
+    #generated at most once per position while it stays in the cache
+    def get_legal_move_map(self):
+        move_map = self.move_cache.get(self.zobrist_key)
+        if move_map == None:
+            move_map = self.generate_legal_move_map()
+            self.move_cache.put(self.zobrist_key, move_map)
+        return move_map
+
+    def generate_legal_move_map(self):
+        color = WHITE if self.white_to_move else BLACK
+        move_map = {}
+        for sq in squares_of(self.bitboard.colors[color]):
+            frompos = (sq & 7, sq >> 3)
+            move_map[frompos] = self.generate_possible_moves(frompos)
+        return move_map
+
+    def generate_possible_moves(self, frompos, checks = True):
+        piece = self.get_piece(frompos)
+        is_white = self.is_piece_white(piece)
+        color = WHITE if is_white else BLACK
+        moves = []
+        if piece&BISHOP > 0:
+            moves = self.get_bishop_moves(frompos, is_white)
+        elif piece&ROOK > 0:
+            moves =  self.get_rook_moves(frompos, is_white)
+        elif piece&KNIGHT > 0:
+            moves =  self.get_knight_moves(frompos, is_white)
+        elif piece&QUEEN > 0:
+            moves =  self.get_queen_moves(frompos, is_white)
+        elif piece&PAWN > 0:
+            moves =  self.get_pawn_moves(frompos, is_white)
+        elif piece&KING > 0:
+            moves =  self.get_king_moves(frompos, is_white)
+        if not checks:
+            return moves
+
+        legal_moves = []
+        for move in moves:
+            self.push((frompos, move, ""))
+            if not self.is_in_check(color):
+                legal_moves += [move]
+            self.pop()
+
+        return legal_moves
+
+    def get_bishop_moves(self, frompos, is_white):
+        piece = WHITE_BISHOP if is_white else BLACK_BISHOP
+        return positions_of(self.bitboard.targets(square(frompos), piece))
+
+    def get_queen_moves(self, frompos, is_white):
+        piece = WHITE_QUEEN if is_white else BLACK_QUEEN
+        return positions_of(self.bitboard.targets(square(frompos), piece))
+
+    def get_king_moves(self, frompos, is_white):
+        piece = WHITE_KING if is_white else BLACK_KING
+        legal_moves = positions_of(self.bitboard.targets(square(frompos), piece))
+
+        x, y = frompos
+        enemy = BLACK if is_white else WHITE
+        rook = WHITE_ROOK if is_white else BLACK_ROOK
+        if ((is_white and self.can_castle_queen_white) or (not is_white and self.can_castle_queen_black)) and x-3 >= 0 \
+                and self.get_piece((0, y)) == rook:
+            if self.get_piece((x-1, y)) == EMPTY and self.get_piece((x-2, y)) == EMPTY and self.get_piece((x-3, y)) == EMPTY:
+                if not self.is_square_attacked(frompos, enemy) and not self.is_square_attacked((x-1, y), enemy) \
+                        and not self.is_square_attacked((x-2, y), enemy):
+                    legal_moves += [(x-2, y)]
+        if ((is_white and self.can_castle_king_white) or (not is_white and self.can_castle_king_black)) and x+2 <= 7 \
+                and self.get_piece((7, y)) == rook:
+            if self.get_piece((x+1, y)) == EMPTY and self.get_piece((x+2, y)) == EMPTY:
+                if not self.is_square_attacked(frompos, enemy) and not self.is_square_attacked((x+1, y), enemy) \
+                        and not self.is_square_attacked((x+2, y), enemy):
+                    legal_moves += [(x+2, y)]
+
+        return legal_moves
+
+    def get_rook_moves(self, frompos, is_white):
+        piece = WHITE_ROOK if is_white else BLACK_ROOK
+        return positions_of(self.bitboard.targets(square(frompos), piece))
+
+    def get_knight_moves(self, frompos, is_white):
+        piece = WHITE_KNIGHT if is_white else BLACK_KNIGHT
+        return positions_of(self.bitboard.targets(square(frompos), piece))
+
+    def get_pawn_moves(self, frompos, is_white):
+        piece = WHITE_PAWN if is_white else BLACK_PAWN
+        return positions_of(self.bitboard.targets(square(frompos), piece, self.en_passant_target))
+
+    def is_piece_white(self, piece):
+        return piece&BLACK == 0
+
+    def within_bounds(self, x, y):
+        return ((0 <= x <= 7) and (0 <= y <= 7))
+
+    def is_square_attacked(self, pos, by_color):
+        return self.bitboard.is_square_attacked(square(pos), by_color)
+
+    def is_in_check(self, color):
+        kings = self.bitboard.pieces[KING + color]
+        if kings == 0:
+            return False
+        return self.bitboard.is_square_attacked(lsb(kings), BLACK if color == WHITE else WHITE)
+
+    def get_all_moves(self, color, checks = False):
+        moves = []
+        for sq in squares_of(self.bitboard.colors[color]):
+            moves += self.get_possible_moves((sq & 7, sq >> 3), checks)
+
+        moves = list(set(moves))
+        return moves
+
+    #Every legal (from_pos, to_pos, promotion_piece) move for the side to move,
+    #with one entry per promotion piece
+    def get_legal_moves(self, cached = True):
+        move_map = self.get_legal_move_map() if cached else self.generate_legal_move_map()
+        last_rank = 0 if self.white_to_move else 7
+        moves = []
+        for frompos, targets in move_map.items():
+            is_pawn = self.get_piece(frompos) & PAWN > 0
+            for to_pos in targets:
+                if is_pawn and to_pos[1] == last_rank:
+                    moves += [(frompos, to_pos, promotion) for promotion in "qrbn"]
+                else:
+                    moves += [(frompos, to_pos, "")]
+        return moves
+
+    #Standard algebraic notation of a legal move for the side to move
+    def get_san(self, move):
+        from_pos, to_pos, promotion_piece = move
+        piece = self.get_piece(from_pos)
+        piece_type = piece & ~BLACK
+        to_name = chr(ord('a') + to_pos[0]) + str(8 - to_pos[1])
+        is_capture = self.get_piece(to_pos) != EMPTY or (piece_type == PAWN and to_pos == self.en_passant_target)
+
+        if piece_type == KING and abs(to_pos[0] - from_pos[0]) == 2:
+            san = "O-O" if to_pos[0] > from_pos[0] else "O-O-O"
+        elif piece_type == PAWN:
+            san = (chr(ord('a') + from_pos[0]) + "x" if is_capture else "") + to_name
+            if to_pos[1] == 0 or to_pos[1] == 7:
+                san += "=" + (promotion_piece or "q").upper()
+        else:
+            #Name the file, rank or both when another piece of the same kind
+            #could move to the same square
+            others = [frompos for frompos, targets in self.get_legal_move_map().items()
+                      if frompos != from_pos and self.get_piece(frompos) == piece and to_pos in targets]
+            san = letters[piece_type]
+            if others:
+                if all(other[0] != from_pos[0] for other in others):
+                    san += chr(ord('a') + from_pos[0])
+                elif all(other[1] != from_pos[1] for other in others):
+                    san += str(8 - from_pos[1])
+                else:
+                    san += chr(ord('a') + from_pos[0]) + str(8 - from_pos[1])
+            san += ("x" if is_capture else "") + to_name
+
+        self.push(move)
+        color = WHITE if self.white_to_move else BLACK
+        if self.is_in_check(color):
+            san += "#" if len(self.get_legal_moves()) == 0 else "+"
+        self.pop()
+        return san
+
+    #(from_pos, to_pos, promotion_piece) of a move in standard algebraic
+    #notation, or None if it is not exactly one legal move
+    def parse_san(self, san):
+        san = san.rstrip("+#!?")
+        rank = 7 if self.white_to_move else 0
+        if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            to_pos = (6 if len(san) == 3 else 2, rank)
+            return ((4, rank), to_pos, "") if to_pos in self.get_possible_moves((4, rank)) else None
+
+        promotion_piece = ""
+        if "=" in san:
+            san, promotion_piece = san.split("=", 1)
+            promotion_piece = promotion_piece.lower()
+            if len(promotion_piece) != 1 or promotion_piece not in "qrbn":
+                return None
+        piece_type = PAWN
+        if san != "" and san[0] in "KQRBN":
+            piece_type = pieces_from_letters[san[0]]
+            san = san[1:]
+        san = san.replace("x", "")
+        if len(san) < 2 or san[-2] not in "abcdefgh" or san[-1] not in "12345678":
+            return None
+        to_pos = (ord(san[-2]) - ord('a'), 8 - int(san[-1]))
+        hint = san[:-2]
+
+        color = WHITE if self.white_to_move else BLACK
+        candidates = []
+        for frompos, targets in self.get_legal_move_map().items():
+            if self.get_piece(frompos) != piece_type + color or to_pos not in targets:
+                continue
+            name = chr(ord('a') + frompos[0]) + str(8 - frompos[1])
+            if all(char in name for char in hint):
+                candidates.append(frompos)
+        if len(candidates) != 1:
+            return None
+        return (candidates[0], to_pos, promotion_piece)
+
+    def make_move(self, from_pos, to_pos, promotion_piece = ""):
+        piece = self.get_piece(from_pos)
+        if self.white_to_move != self.is_piece_white(piece):
+            return False
+        if not self.is_move_legal(from_pos, to_pos):
+            return False
+
+        #A move made after the flag fell loses on time, whenever it gets here
+        self.stop_clock()
+        if self.clock.time_left_ns(self.white_to_move) <= 0:
+            self.check_for_clock_win()
+            return False
+        self.add_increment()
+
+        self.should_send_fen = True
+        move = (from_pos, to_pos, promotion_piece)
+        self.push(move)
+
+        color = WHITE if self.white_to_move else BLACK
+        moves = self.get_all_moves(color, checks=True)
+        is_in_check = self.is_in_check(color)
+
+        #Generate fen, handle history. A move made after stepping back
+        #replaces the rest of the line, in the record too.
+        fen = self.generate_fen()
+        if self.recorder != None and self.history.ply < len(self.history):
+            self.recorder.truncate(self.history.ply)
+        self.history.add(move, self.zobrist_key, self.get_fen())
+        self.trim_undo_stack()
+
+        self.status = fen
+
+        #Check if sufficient material
+        if not self.is_sufficient_material(False) and not self.is_sufficient_material(True):
+            self.draw_insufficient_material = True
+            self.status = "Insufficient mating material"
+
+        #Handle game result
+        if self.clock_win:
+            self.status = ("White" if self.white_victory else "Black") + " win by timeout"
+        elif self.draw_insufficient_material:
+            self.status = "Insufficient mating material"
+        elif len(moves) == 0 and is_in_check:
+            self.checkmate = True
+            self.status = "Checkmate"
+        elif len(moves) == 0 and not is_in_check:
+            self.stalemate = True
+            self.status = "Stalemate"
+        elif self.halfmove_clock >= 100:
+            self.stalemate = True
+            self.status = "Draw by 50-move rule"
+        elif self.repetition_count() >= 3:
+            self.stalemate = True
+            self.status = "Draw by repetition"
+
+        timing = self.clock.end_turn(not self.white_to_move)
+        if self.recorder != None:
+            self.recorder.add_move(move, timing.clock)
+
+        if self.print_moves:
+            print (fen)
+        
+
+        return True
+
+    #Applies a (from_pos, to_pos, promotion_piece) move and records what is
+    #needed to take it back with pop()
+    def push(self, move):
+        from_pos, to_pos, promotion_piece = move
+        x1, y1 = from_pos
+        x2, y2 = to_pos
+        piece = self.get_piece(from_pos)
+        captured_pos = to_pos
+        if piece & PAWN > 0 and to_pos == self.en_passant_target:
+            captured_pos = (x2, y1)
+        captured = self.get_piece(captured_pos)
+        castling = (self.can_castle_king_white, self.can_castle_queen_white, self.can_castle_king_black, self.can_castle_queen_black)
+        #What stood on the corner the rook comes from when castling
+        corner = None
+        if piece & KING > 0 and abs(x1 - x2) == 2:
+            corner = self.get_piece((0, y2) if x2 < x1 else (7, y2))
+        self.undo_stack.append((move, piece, captured, captured_pos, castling, self.en_passant_target, self.halfmove_clock, self.prev_move, self.zobrist_key, corner))
+
+        #Check if should revoke castling rights
+        self.check_for_castling(from_pos, to_pos)
+
+        #Move piece, handle en passant capture and promotion
+        self.set_piece(captured_pos, EMPTY)
+        self.set_piece(to_pos, piece)
+        self.set_piece(from_pos, EMPTY)
+        if piece == BLACK_PAWN and y2 == 7:
+            new_piece = BLACK_QUEEN if promotion_piece == "" else pieces_from_letters[promotion_piece]
+            self.set_piece(to_pos, new_piece)
+        if piece == WHITE_PAWN and y2 == 0:
+            new_piece = WHITE_QUEEN if promotion_piece == "" else pieces_from_letters[promotion_piece.upper()]
+            self.set_piece(to_pos, new_piece)
+
+        #Check en passant target
+        self.en_passant_target = (-1, -1)
+        if piece & PAWN > 0 and abs(y2 - y1) == 2:
+            self.en_passant_target = (x2, int((y1 + y2)/2))
+
+        #If castled, move rook
+        if piece & KING > 0 and abs(x1 - x2) == 2:
+            rook = WHITE_ROOK if self.is_piece_white(piece) else BLACK_ROOK
+            self.set_piece((int((x1+x2)/2), y2), rook)
+            if x2 < x1:
+                self.set_piece((0, y2), EMPTY)
+            else:
+                self.set_piece((7, y2), EMPTY)
+
+        #Handle move clock
+        if piece & PAWN > 0 or captured != EMPTY:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not self.white_to_move:
+            self.moves += 1
+        self.prev_move = [from_pos, to_pos]
+        self.white_to_move = not self.white_to_move
+        self.update_zobrist_key()
+
+    def pop(self):
+        move, piece, captured, captured_pos, castling, en_passant_target, halfmove_clock, prev_move, zobrist_key, corner = self.undo_stack.pop()
+        from_pos, to_pos, _ = move
+        x1, y1 = from_pos
+        x2, y2 = to_pos
+
+        if corner != None:
+            self.set_piece((int((x1+x2)/2), y2), EMPTY)
+            self.set_piece((0, y2) if x2 < x1 else (7, y2), corner)
+        self.set_piece(to_pos, EMPTY)
+        self.set_piece(captured_pos, captured)
+        self.set_piece(from_pos, piece)
+
+        self.can_castle_king_white, self.can_castle_queen_white, self.can_castle_king_black, self.can_castle_queen_black = castling
+        self.en_passant_target = en_passant_target
+        self.halfmove_clock = halfmove_clock
+        self.prev_move = prev_move
+        self.zobrist_key = zobrist_key
+        self.white_to_move = not self.white_to_move
+        if not self.white_to_move:
+            self.moves -= 1
+
+    def update_zobrist_key(self):
+        en_passant_file = -1
+        if self.en_passant_target != (-1, -1):
+            color = WHITE if self.white_to_move else BLACK
+            if PAWN_ATTACKS[color ^ BLACK][square(self.en_passant_target)] & self.bitboard.pieces[PAWN + color]:
+                en_passant_file = self.en_passant_target[0]
+        castling = (self.can_castle_king_white, self.can_castle_queen_white, self.can_castle_king_black, self.can_castle_queen_black)
+        self.zobrist_key = self.bitboard.key ^ state_key(self.white_to_move, castling, en_passant_file)
+
+    #Keeps only the undo records seek can step back through, one checkpoint
+    #interval. Older positions are rebuilt from the checkpoints and their keys
+    #are in the game history, so a long game does not hold a record per ply.
+    def trim_undo_stack(self):
+        keep = self.history.checkpoint_interval
+        if len(self.undo_stack) > 2 * keep:
+            drop = len(self.undo_stack) - keep
+            del self.undo_stack[:drop]
+            self.undo_base += drop
+
+    #Only positions since the last capture or pawn move can repeat. Keys older
+    #than the undo stack come from the game history.
+    def repetition_count(self):
+        count = 1
+        ply = self.undo_base + len(self.undo_stack)
+        for i in range(2, min(self.halfmove_clock, ply) + 1, 2):
+            if ply - i >= self.undo_base:
+                key = self.undo_stack[ply - i - self.undo_base][8]
+            else:
+                key = self.history.keys[ply - i]
+            if key == self.zobrist_key:
+                count += 1
+        return count
+
+    #A king move takes both rights of its side. Anything moving from or to a
+    #rook's corner takes that right, whatever stands there, so a rook that
+    #captures a rook on its corner revokes both sides' rights.
+    def check_for_castling(self, moved_from_pos, moved_to_pos):
+        piece_from = self.get_piece(moved_from_pos)
+        if piece_from == BLACK_KING:
+            self.can_castle_king_black = False
+            self.can_castle_queen_black = False
+        elif piece_from == WHITE_KING:
+            self.can_castle_king_white = False
+            self.can_castle_queen_white = False
+
+        for pos in (moved_from_pos, moved_to_pos):
+            if pos == (0, 0):
+                self.can_castle_queen_black = False
+            elif pos == (7, 0):
+                self.can_castle_king_black = False
+            elif pos == (0, 7):
+                self.can_castle_queen_white = False
+            elif pos == (7, 7):
+                self.can_castle_king_white = False
+
+    #ply is where the state is in the game history
+    def load_from_state(self, state, ply = 0):
+        self.bitboard = Bitboard(state.board)
+        self.placement = Fen.Placement(self.bitboard.mailbox)
+        self.white_to_move = state.white_to_move
+        self.can_castle_king_black = state.can_castle_king_black
+        self.can_castle_king_white = state.can_castle_king_white
+        self.can_castle_queen_black = state.can_castle_queen_black
+        self.can_castle_queen_white = state.can_castle_queen_white
+        self.en_passant_target = state.en_passant_target
+        self.moves = state.moves
+        self.halfmove_clock = state.halfmove_clock
+        self.prev_move = state.prev_move
+        self.undo_stack = []
+        self.undo_base = ply
+        self.update_zobrist_key()
+
+    #Shows the position at any ply of the game history. Steps from the current
+    #position when that is no further than the closest checkpoint, otherwise
+    #loads the checkpoint, so no seek replays more than one checkpoint interval.
+    def seek(self, ply):
+        history = self.history
+        ply = max(0, min(ply, len(history)))
+        checkpoint_ply, fen = history.get_checkpoint(ply)
+        if history.ply <= ply and history.ply >= checkpoint_ply:
+            pass
+        elif history.ply > ply and ply >= self.undo_base and history.ply - ply <= ply - checkpoint_ply:
+            while history.ply > ply:
+                self.pop()
+                history.ply -= 1
+            return
+        else:
+            prev_move = [(-1, -1), (-1, -1)]
+            if checkpoint_ply > 0:
+                prev_move = list(history.get_move(checkpoint_ply - 1)[:2])
+            self.load_from_state(BoardState(fen, prev_move, strict=False), checkpoint_ply)
+            history.ply = checkpoint_ply
+        while history.ply < ply:
+            self.push(history.get_move(history.ply))
+            history.ply += 1
+        self.trim_undo_stack()
+
+    def move_forward(self):
+        if not self.history.has_next():
+            return False
+        self.seek(self.history.ply + 1)
+        return True
+
+    def move_back(self):
+        if not self.history.has_prev():
+            return False
+        self.seek(self.history.ply - 1)
+        return True
+
+    def get_fen(self):
+        castling = (self.can_castle_king_white, self.can_castle_queen_white, self.can_castle_king_black, self.can_castle_queen_black)
+        return Fen.encode(self.placement.get(), self.white_to_move, castling, self.en_passant_target, self.halfmove_clock, self.moves)
+
+    #What engines are sent, the FEN followed by both clocks in milliseconds
+    def generate_fen(self):
+        return self.get_fen() + " " + str(int(self.time_left_white)) + " " + str(int(self.time_left_black))
+
+    #What an engine pondering on move is sent, generate_fen() of the position
+    #after it, and that position's key. None unless move is legal here.
+    def generate_ponder_fen(self, move):
+        from_pos, to_pos, _ = move
+        if self.is_game_ended() or to_pos not in self.get_legal_move_map().get(from_pos, []):
+            return None
+        self.push(move)
+        fen, key = self.generate_fen(), self.zobrist_key
+        self.pop()
+        return (fen, key)
+
+    def is_move_legal(self, from_pos, to_pos):
+        moves = self.get_possible_moves(from_pos)
+        piece = self.get_piece(from_pos)
+        if moves.count((to_pos)) > 0:
+            return True
+        return False
@@ -0,0 +1,182 @@
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .Constants import STARTING_FEN
+from .Position import Position
+from .Engine import sanitize_input
+from .GameRecord import read_log
+
+#Endings the board decides by itself. A recorded game with one of these
+#reasons has to end exactly that way on replay.
+RULE_ENDINGS = ["Checkmate", "Stalemate", "Draw by 50-move rule", "Draw by repetition", "Insufficient mating material"]
+
+Divergence = namedtuple("Divergence", ["path", "index", "white", "black", "message"])
+
+_comment = re.compile(r"\{[^}]*\}|;[^\n]*")
+_move_number = re.compile(r"^\d+\.+")
+
+#Games of a PGN file as dicts like GameRecord.read_log gives, with the moves
+#as SAN strings
+def read_pgn(path):
+    games = []
+    headers = {}
+    movetext = []
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith("[") and line.endswith("]"):
+                if movetext:
+                    games.append(_pgn_game(headers, movetext))
+                    headers, movetext = {}, []
+                name, _, value = line[1:-1].partition(" ")
+                headers[name] = value.strip().strip("\"").replace("\\\"", "\"").replace("\\\\", "\\")
+            elif line and not line.startswith("%"):
+                movetext.append(line)
+    if movetext or headers:
+        games.append(_pgn_game(headers, movetext))
+    return games
+
+def _pgn_game(headers, movetext):
+    text = _comment.sub(" ", "\n".join(movetext))
+    #Variations can nest, drop them innermost first
+    while "(" in text:
+        stripped = re.sub(r"\([^()]*\)", " ", text)
+        if stripped == text:
+            break
+        text = stripped
+    moves = []
+    result = headers.get("Result", "*")
+    for token in text.split():
+        token = _move_number.sub("", token)
+        if token == "" or token.startswith("$"):
+            continue
+        if token in ("1-0", "0-1", "1/2-1/2", "*"):
+            result = token
+            continue
+        moves.append(token)
+    return {"fen": headers.get("FEN", STARTING_FEN), "white": headers.get("White", "?"), "black": headers.get("Black", "?"),
+            "moves": moves, "result": result, "reason": headers.get("Termination", ""), "notation": "san"}
+
+#Games of a UCI move list, one game per line in the form of the UCI position
+#command with an optional result at the end:
+#position startpos moves e2e4 e7e5 ... 1-0
+#position fen <FEN> moves e2e4 ...
+def read_uci(path):
+    games = []
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for line in file:
+            tokens = line.split()
+            if not tokens or tokens[0] != "position":
+                continue
+            fen = STARTING_FEN
+            if "moves" in tokens:
+                setup, moves = tokens[1:tokens.index("moves")], tokens[tokens.index("moves") + 1:]
+            else:
+                setup, moves = tokens[1:], []
+            if setup[:1] == ["fen"]:
+                fen = " ".join(setup[1:])
+            result = "*"
+            if moves and moves[-1] in ("1-0", "0-1", "1/2-1/2", "*"):
+                result = moves.pop()
+            games.append({"fen": fen, "white": "?", "black": "?", "moves": moves, "result": result, "reason": "", "notation": "uci"})
+    return games
+
+def read_games(path):
+    if path.endswith(".pgn"):
+        return read_pgn(path)
+    if path.endswith(".log"):
+        games = read_log(path)
+        for game in games:
+            game["moves"] = [move for move, clock in game["moves"]]
+        return games
+    return read_uci(path)
+
+#Plays a game through make_move and checks it ends the way it was recorded.
+#Returns None if it does, otherwise what went wrong.
+def verify_game(game):
+    try:
+        position = Position(game["fen"])
+    except (ValueError, IndexError, KeyError):
+        return "bad starting position " + game["fen"]
+    position.print_moves = False
+    moves = game["moves"]
+    for ply, move in enumerate(moves):
+        if position.is_game_ended():
+            return position.status + " after ply " + str(ply) + " but " + str(len(moves) - ply) + " more moves were recorded"
+        if game.get("notation") == "san":
+            parsed = position.parse_san(move)
+        elif game.get("notation") == "uci":
+            parsed = sanitize_input(move)
+        else:
+            parsed = move
+        if parsed == None or not position.make_move(parsed[0], parsed[1], parsed[2]):
+            return "illegal move " + str(move) + " at ply " + str(ply + 1)
+
+    result, reason = game["result"], game["reason"]
+    if position.is_game_ended():
+        if result != position.get_result() or (reason in RULE_ENDINGS and reason != position.status):
+            return "recorded " + result + " (" + (reason or "no reason") + ") but replay gives " + position.get_result() + " (" + position.status + ")"
+        return None
+    #A clock flag against a lone king is also a draw for lack of material
+    if reason == "Insufficient mating material" and result == "1/2-1/2" \
+       and (not position.is_sufficient_material(True) or not position.is_sufficient_material(False)):
+        return None
+    if reason in RULE_ENDINGS:
+        return "recorded " + result + " (" + reason + ") but the game is not over on replay"
+    return None
+
+#(moves replayed, divergences) of games numbered from first_index on
+def verify_games(path, first_index, games):
+    divergences = []
+    moves = 0
+    for index, game in enumerate(games, first_index):
+        message = verify_game(game)
+        if message != None:
+            divergences.append(Divergence(path, index, game["white"], game["black"], message))
+        moves += len(game["moves"])
+    return (moves, divergences)
+
+#Verifies every file in a process pool. Files are read here and their games
+#handed out in chunks, so one big file keeps every worker busy too.
+#on_file(path, games, moves, divergences) is called as each file finishes.
+#Returns (games, moves, divergences, seconds).
+def verify_files(paths, processes = None, on_file = None, chunk_size = 16):
+    start = time.perf_counter()
+    total_games = 0
+    total_moves = 0
+    divergences = []
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        files = {}
+        jobs = {}
+        for path in paths:
+            try:
+                games = read_games(path)
+                errors = []
+            except (OSError, ValueError) as e:
+                games = []
+                errors = [Divergence(path, 0, "?", "?", "could not read: " + str(e))]
+            files[path] = [len(games), 0, errors, 0]   #games, moves, divergences, chunks left
+            for first in range(0, len(games), chunk_size):
+                jobs[pool.submit(verify_games, path, first + 1, games[first:first + chunk_size])] = path
+                files[path][3] += 1
+            total_games += len(games)
+            if files[path][3] == 0:
+                divergences += errors
+                if on_file != None:
+                    on_file(path, 0, 0, errors)
+
+        for job in as_completed(jobs):
+            path = jobs[job]
+            moves, file_divergences = job.result()
+            files[path][1] += moves
+            files[path][2] += file_divergences
+            files[path][3] -= 1
+            total_moves += moves
+            if files[path][3] == 0:
+                file_divergences = sorted(files[path][2], key=lambda divergence: divergence.index)
+                divergences += file_divergences
+                if on_file != None:
+                    on_file(path, files[path][0], files[path][1], file_divergences)
+    return (total_games, total_moves, divergences, time.perf_counter() - start)
@@ -0,0 +1,174 @@
+import math
+import multiprocessing
+import os
+import queue
+import signal
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .Constants import STARTING_FEN
+from .Arbiter import play_game
+from .Engine import sanitize_input
+from .Tournament import SCORES
+
+#Sequential probability ratio test between two engines. The log likelihood
+#ratio of "the new engine is elo1 stronger" against "it is elo0 stronger" is
+#updated after every game, with the game scores taken as normally
+#distributed, and the match stops once it leaves the bounds set by alpha
+#(chance of accepting elo1 when elo0 is true) and beta (the other way round).
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+class Sprt:
+    def __init__(self, elo0 = 0, elo1 = 5, alpha = 0.05, beta = 0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    #score is 1, 0.5 or 0 from the new engine's side
+    def add_result(self, score):
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    #(mean score, variance of one game's score). The variance also counts one
+    #win and one loss that are not played, so a run of identical results, like
+    #an engine losing every game, still has a spread and moves the LLR
+    def score(self):
+        games = self.games()
+        if games == 0:
+            return (0.5, 0)
+        mean = (self.wins + self.draws / 2) / games
+        variance = ((self.wins + 1) * (1 - mean) ** 2 + self.draws * (0.5 - mean) ** 2 + (self.losses + 1) * mean ** 2) / (games + 2)
+        return (mean, variance)
+
+    def llr(self):
+        if self.games() == 0:
+            return 0
+        mean, variance = self.score()
+        score0, score1 = expected_score(self.elo0), expected_score(self.elo1)
+        return self.games() * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+    #"H1" once the new engine is shown to be elo1 stronger, "H0" once it is
+    #shown not to be, None while the test goes on
+    def result(self):
+        llr = self.llr()
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+    #(elo, margin) with a 95% confidence interval of elo - margin to elo + margin
+    def elo(self):
+        mean, variance = self.score()
+        games = self.games()
+        if games == 0:
+            return (0, 0)
+        deviation = 1.959964 * math.sqrt(variance / games)
+        return (elo_from_score(mean), (elo_from_score(mean + deviation) - elo_from_score(mean - deviation)) / 2)
+
+    def format(self):
+        elo, margin = self.elo()
+        return "Games " + str(self.games()) + ": +" + str(self.wins) + " =" + str(self.draws) + " -" + str(self.losses) \
+               + "  Elo " + "{:0.1f}".format(elo) + " +- " + "{:0.1f}".format(margin) \
+               + "  LLR " + "{:0.2f}".format(self.llr()) + " [" + "{:0.2f}".format(self.lower) + ", " + "{:0.2f}".format(self.upper) + "]"
+
+
+#Game workers turn SIGTERM into SystemExit while they play a game, so a game
+#stopped once the test has decided still runs play_game's cleanup and stops its
+#engines. An idle worker could be holding the pool's queue locks, so it only
+#remembers the signal, skips any game it is handed afterwards and exits when the
+#pool shuts down. Each worker puts its pid on pids so run_sprt knows which
+#processes to stop
+_playing = False
+_terminated = False
+
+def _exit_on_terminate(signum, frame):
+    global _terminated
+    _terminated = True
+    if _playing:
+        raise SystemExit(1)
+
+def _init_worker(pids):
+    signal.signal(signal.SIGTERM, _exit_on_terminate)
+    pids.put(os.getpid())
+
+def _play_game(*args, **kwargs):
+    global _playing
+    _playing = True
+    try:
+        if _terminated:
+            raise SystemExit(1)
+        return play_game(*args, **kwargs)
+    finally:
+        _playing = False
+
+#Plays new against base with alternating colors until sprt has a result or
+#max_games have been played. new and base are (name, command), the other
+#arguments are as for Tournament.run_tournament. on_result(white, black,
+#result, reason, sprt) is called after every game. Games still running when
+#the test ends are not counted. Their workers are sent SIGTERM, which ends the
+#games and stops their engines, and run_sprt returns sprt once the workers
+#have exited.
+def run_sprt(new, base, sprt, max_games = 100000, concurrency = None, fen = STARTING_FEN, time_left = 5*60*1000, increment = 3000,
+             framing = "newline", on_result = None, writer = None, ponder = False, transport = "tcp", uci = ()):
+    commands = dict([new, base])
+    workers = concurrency or os.cpu_count()
+    pids = multiprocessing.Queue()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pids,))
+    running = {}
+    started = 0
+    try:
+        while True:
+            while started < max_games and len(running) < workers:
+                white, black = (new[0], base[0]) if started % 2 == 0 else (base[0], new[0])
+                game = pool.submit(_play_game, commands[white], commands[black], fen, time_left, increment, framing=framing, ponder=ponder,
+                                   transport=transport, white_uci=white in uci, black_uci=black in uci)
+                running[game] = (white, black)
+                started += 1
+            if not running:
+                return sprt
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for game in done:
+                white, black = running.pop(game)
+                try:
+                    result, reason, moves, timings = game.result()
+                except Exception as e:
+                    result, reason, moves, timings = "*", "Error: " + str(e), [], []
+                if result in SCORES:
+                    sprt.add_result(SCORES[result][0 if white == new[0] else 1])
+                if writer != None:
+                    moves = [tuple(sanitize_input(move)) for move in moves]
+                    writer.write_game(white, black, fen, list(zip(moves, [timing.clock for timing in timings])),
+                                      result, reason, event="ChessBot SPRT")
+                if on_result != None:
+                    on_result(white, black, result, reason, sprt)
+                if sprt.result() != None:
+                    return sprt
+    finally:
+        #Games still running have no say in the result any more
+        while True:
+            try:
+                pid = pids.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,23 @@
+import time
+
+#Wall time of each startup step, printed by run.py --startup-profile
+class StartupProfile:
+    def __init__(self, start = None):
+        self.start = time.perf_counter() if start == None else start
+        self.last = self.start
+        self.steps = []
+
+    #Closes the step that has been running since the previous mark, at is a
+    #perf_counter() reading for steps that ended earlier
+    def mark(self, name, at = None):
+        now = time.perf_counter() if at == None else at
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        width = max([len(name) for name, _ in self.steps] + [5]) + 2
+        lines = ["Startup profile:"]
+        for name, seconds in self.steps:
+            lines.append("  " + name.ljust(width) + "{:8.1f}".format(seconds * 1000) + " ms")
+        lines.append("  " + "Total".ljust(width) + "{:8.1f}".format((self.last - self.start) * 1000) + " ms")
+        return "\n".join(lines)
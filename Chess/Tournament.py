@@ -0,0 +1,92 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .Constants import STARTING_FEN
+from .Arbiter import play_game
+from .Engine import sanitize_input
+
+SCORES = {"1-0": (1, 0), "0-1": (0, 1), "1/2-1/2": (0.5, 0.5)}
+
+
+#Every pair meets once per round with each color
+def round_robin(names, rounds = 1):
+    pairings = []
+    for round in range(rounds):
+        for i in range(len(names)):
+            for j in range(i + 1, len(names)):
+                pairings += [(names[i], names[j]), (names[j], names[i])]
+    return pairings
+
+#The first engine plays everyone else once per round with each color
+def gauntlet(names, rounds = 1):
+    pairings = []
+    for round in range(rounds):
+        for opponent in names[1:]:
+            pairings += [(names[0], opponent), (opponent, names[0])]
+    return pairings
+
+PAIRING_SCHEMES = {"roundrobin": round_robin, "gauntlet": gauntlet}
+
+
+class Crosstable:
+    def __init__(self, names):
+        self.names = list(names)
+        self.scores = {name: {opponent: 0 for opponent in names} for name in names}
+        self.games = {name: {opponent: 0 for opponent in names} for name in names}
+
+    def add_result(self, white, black, result):
+        if result not in SCORES:
+            return
+        white_score, black_score = SCORES[result]
+        self.scores[white][black] += white_score
+        self.scores[black][white] += black_score
+        self.games[white][black] += 1
+        self.games[black][white] += 1
+
+    def total(self, name):
+        return sum(self.scores[name].values()), sum(self.games[name].values())
+
+    def format(self):
+        width = max(len(name) for name in self.names) + 2
+        ranked = sorted(self.names, key=lambda name: -self.total(name)[0])
+        lines = ["".ljust(width) + "".join(name[:8].rjust(10) for name in ranked) + "Score".rjust(12)]
+        for name in ranked:
+            line = name.ljust(width)
+            for opponent in ranked:
+                if opponent == name:
+                    line += "-".rjust(10)
+                else:
+                    line += (str(self.scores[name][opponent]) + "/" + str(self.games[name][opponent])).rjust(10)
+            score, games = self.total(name)
+            line += (str(score) + "/" + str(games)).rjust(12)
+            lines.append(line)
+        return "\n".join(lines)
+
+
+#engines is a list of (name, command), uci the names of those that speak UCI.
+#Games run concurrently in a process pool, on_result(white, black, result,
+#reason, timings) is called as each one ends and finished games go to writer
+#(a GameRecord.RecordWriter) if given.
+def run_tournament(engines, scheme = "roundrobin", rounds = 1, concurrency = None, fen = STARTING_FEN,
+                   time_left = 5*60*1000, increment = 3000, framing = "newline", on_result = None, writer = None, ponder = False,
+                   transport = "tcp", uci = ()):
+    commands = dict(engines)
+    crosstable = Crosstable(commands.keys())
+    pairings = PAIRING_SCHEMES[scheme](list(commands.keys()), rounds)
+    with ProcessPoolExecutor(max_workers=concurrency or os.cpu_count()) as pool:
+        games = {pool.submit(play_game, commands[white], commands[black], fen, time_left, increment, framing=framing, ponder=ponder,
+                             transport=transport, white_uci=white in uci, black_uci=black in uci): (white, black)
+                 for white, black in pairings}
+        for game in as_completed(games):
+            white, black = games[game]
+            try:
+                result, reason, moves, timings = game.result()
+            except Exception as e:
+                result, reason, moves, timings = "*", "Error: " + str(e), [], []
+            crosstable.add_result(white, black, result)
+            if writer != None:
+                moves = [tuple(sanitize_input(move)) for move in moves]
+                writer.write_game(white, black, fen, list(zip(moves, [timing.clock for timing in timings])),
+                                  result, reason, event="ChessBot tournament")
+            if on_result != None:
+                on_result(white, black, result, reason, timings)
+    return crosstable
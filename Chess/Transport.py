@@ -0,0 +1,294 @@
+import os
+import select
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+#Connections to engines other than TCP sockets. Each one has the part of the
+#socket interface the arbiter uses, fileno() for select(), sendall(), recv()
+#and close().
+
+#How engines can be reached. tcp connects to a port, unix to a Unix domain
+#socket and shm meets on a Unix domain socket and then moves every message
+#through shared memory, pipe is an engine started with its stdin and stdout
+#as the connection.
+TRANSPORTS = ["tcp", "pipe"]
+if hasattr(socket, "AF_UNIX"):
+    TRANSPORTS.append("unix")
+    if hasattr(os, "eventfd") and hasattr(socket, "send_fds"):
+        TRANSPORTS.append("shm")
+
+#Where engines connect with unix and shm, named after the tcp port the side
+#would have used
+def socket_path(port):
+    return os.path.join(tempfile.gettempdir(), "chessbot-" + str(port) + ".sock")
+
+def listen_unix(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    return listener
+
+#select() only takes sockets on Windows
+_selectable_pipes = os.name != "nt"
+
+def _copy(source, destination):
+    try:
+        while True:
+            data = source.read1(4096) if hasattr(source, "read1") else source.read(4096)
+            if not data:
+                break
+            destination.sendall(data)
+    except OSError:
+        pass
+    finally:
+        destination.close()
+
+#An engine process started by Engine.launch_pipe_engine, talking over its
+#stdin and stdout
+class PipeConnection:
+    def __init__(self, process):
+        self.process = process
+        self.socket = None
+        if not _selectable_pipes:
+            #The engine's output is copied into a socket pair by a thread so
+            #it can be waited on with select() like the rest
+            self.socket, inlet = socket.socketpair()
+            threading.Thread(target=_copy, args=(process.stdout, inlet), daemon=True).start()
+
+    def fileno(self):
+        if self.socket != None:
+            return self.socket.fileno()
+        return self.process.stdout.fileno()
+
+    def sendall(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.process.stdin.fileno(), view):]
+
+    def recv(self, size):
+        if self.socket != None:
+            return self.socket.recv(size)
+        return os.read(self.process.stdout.fileno(), size)
+
+    def close(self):
+        for pipe in (self.process.stdin, self.process.stdout, self.socket):
+            try:
+                if pipe != None:
+                    pipe.close()
+            except OSError:
+                pass
+
+#One direction of a shared memory connection, a byte ring with a single
+#writer and a single reader. head is only written by the writer and tail
+#only by the reader, both count bytes since the start and are 8 byte
+#aligned so they are never seen half written.
+class ShmRing:
+    HEADER = 64
+
+    def __init__(self, buffer, offset, capacity):
+        self.buffer = buffer
+        self.offset = offset
+        self.data = offset + self.HEADER
+        self.capacity = capacity
+
+    def _counters(self):
+        return struct.unpack_from("<QQ", self.buffer, self.offset)
+
+    def is_closed(self):
+        return self.buffer[self.offset + 16] != 0
+
+    #Bytes written and not read yet
+    def pending(self):
+        head, tail = self._counters()
+        return head - tail
+
+    def close(self):
+        self.buffer[self.offset + 16] = 1
+
+    #Writes as much of data as fits, returns how much that was
+    def write(self, data):
+        head, tail = self._counters()
+        size = min(len(data), self.capacity - (head - tail))
+        start = head % self.capacity
+        first = min(size, self.capacity - start)
+        self.buffer[self.data + start:self.data + start + first] = data[:first]
+        self.buffer[self.data:self.data + size - first] = data[first:size]
+        struct.pack_into("<Q", self.buffer, self.offset, head + size)
+        return size
+
+    def read(self, size):
+        head, tail = self._counters()
+        size = min(size, head - tail)
+        start = tail % self.capacity
+        first = min(size, self.capacity - start)
+        data = bytes(self.buffer[self.data + start:self.data + start + first]) + bytes(self.buffer[self.data:self.data + size - first])
+        struct.pack_into("<Q", self.buffer, self.offset + 8, tail + size)
+        return data
+
+#A connection whose messages go through two ShmRings in one shared memory
+#segment. Each side rings the other's eventfd after writing. The Unix domain
+#socket the two sides met on stays open so either notices when the other
+#process is gone, and fileno() is an epoll of both, so select() wakes up on
+#either like on a socket.
+#
+#The board starts it with serve(), which sends the engine the line
+#"shm <segment name> <ring capacity>" with two eventfds attached, the one
+#the board rings and the one the engine rings. The board's ring is the
+#first in the segment, the engine's the second. connect() is the engine's
+#side of that.
+class ShmConnection:
+    def __init__(self, rendezvous, memory, capacity, incoming, outgoing, is_board):
+        self.rendezvous = rendezvous
+        self.memory = memory
+        self.is_board = is_board
+        rings = [ShmRing(memory.buf, i * (ShmRing.HEADER + capacity), capacity) for i in range(2)]
+        self.output, self.input = rings if is_board else rings[::-1]
+        self.incoming = incoming
+        self.outgoing = outgoing
+        self.poll = select.epoll()
+        self.poll.register(incoming, select.EPOLLIN)
+        self.poll.register(rendezvous, select.EPOLLIN | select.EPOLLRDHUP)
+
+    @staticmethod
+    def serve(rendezvous, capacity = 64*1024):
+        from multiprocessing import shared_memory
+        memory = shared_memory.SharedMemory(create=True, size=2 * (ShmRing.HEADER + capacity))
+        to_engine = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        to_board = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        message = ("shm " + memory.name + " " + str(capacity) + "\n").encode()
+        socket.send_fds(rendezvous, [message], [to_engine, to_board])
+        return ShmConnection(rendezvous, memory, capacity, to_board, to_engine, True)
+
+    @staticmethod
+    def connect(rendezvous):
+        from multiprocessing import shared_memory, resource_tracker
+        message, fds, _, _ = socket.recv_fds(rendezvous, 1024, 2)
+        tokens = message.decode().split()
+        if len(tokens) != 3 or tokens[0] != "shm" or len(fds) != 2:
+            raise ConnectionError("Expected a shared memory handshake, got " + repr(message))
+        memory = shared_memory.SharedMemory(name=tokens[1])
+        #The board owns the segment and removes it, this process must not
+        try:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except Exception:
+            pass
+        return ShmConnection(rendezvous, memory, int(tokens[2]), fds[0], fds[1], False)
+
+    def fileno(self):
+        return self.poll.fileno()
+
+    def is_peer_gone(self):
+        try:
+            return self.rendezvous.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def sendall(self, data):
+        view = memoryview(data)
+        while True:
+            view = view[self.output.write(view):]
+            os.eventfd_write(self.outgoing, 1)
+            if not view:
+                return
+            if self.output.is_closed() or self.is_peer_gone():
+                raise BrokenPipeError("Shared memory connection closed")
+            #The reader has fallen a whole ring behind
+            time.sleep(0.0001)
+
+    #Like a non-blocking socket, raises BlockingIOError if a wake up found
+    #nothing left to read and returns b'' once the other side has closed.
+    #Bytes left over after reading size of them ring the eventfd again, so
+    #select() still reports the connection readable.
+    def recv(self, size):
+        try:
+            os.eventfd_read(self.incoming)
+        except BlockingIOError:
+            pass
+        data = self.input.read(size)
+        if self.input.pending():
+            os.eventfd_write(self.incoming, 1)
+        if data:
+            return data
+        if self.input.is_closed() or self.is_peer_gone():
+            return b''
+        raise BlockingIOError("Nothing to read yet")
+
+    def close(self):
+        if self.memory == None:
+            return
+        self.output.close()
+        self.input.close()
+        try:
+            os.eventfd_write(self.outgoing, 1)
+        except OSError:
+            pass
+        self.poll.close()
+        for fd in (self.incoming, self.outgoing):
+            os.close(fd)
+        self.rendezvous.close()
+        self.output = self.input = None
+        self.memory.close()
+        if self.is_board:
+            self.memory.unlink()
+        self.memory = None
+
+#The board's side of tcp, unix and shm, shared by run.py and
+#Arbiter.play_game. Listens where the engine for port connects, port 0 picks
+#a free tcp port. For unix and shm the socket is named after port. Returns
+#(listener, address) with the address to give the engine.
+def listen_engine(transport, port):
+    if transport == "tcp":
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('localhost', port))
+        listener.listen(1)
+        return (listener, listener.getsockname()[1])
+    if transport == "unix" or transport == "shm":
+        path = socket_path(port)
+        return (listen_unix(path), path)
+    raise ValueError("Unknown transport " + transport)
+
+#Waits up to timeout seconds for the engine, None waits for as long as it
+#takes. With shm the accepted socket is kept as the rendezvous of a
+#ShmConnection.
+def accept_engine(listener, transport, timeout = None):
+    listener.settimeout(timeout)
+    connection, _ = listener.accept()
+    connection.setblocking(True)
+    if transport == "shm":
+        return ShmConnection.serve(connection)
+    if transport == "tcp":
+        #A position written right after a ponder message must not wait on
+        #Nagle's algorithm while the engine's clock runs
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return connection
+
+#Closes a listener from listen_engine and removes its socket file
+def close_listener(listener):
+    path = listener.getsockname() if listener.family != socket.AF_INET else None
+    listener.close()
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+#The engine's side of every transport but pipe, address is a port for tcp
+#and a socket path for unix and shm
+def connect_engine(transport, address):
+    if transport == "tcp":
+        connection = socket.create_connection(("localhost", int(address)))
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(address)
+    if transport == "shm":
+        return ShmConnection.connect(connection)
+    return connection
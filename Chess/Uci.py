@@ -0,0 +1,60 @@
+from .Engine import MessageBuffer, encode_messages
+
+#Lets engines that speak UCI play on the board. The board's messages are
+#turned into position and go commands and bestmove back into a move, with
+#the ponder move kept so pondering works the same as for our own engines.
+
+#Sent before the game, each waiting for its answer so the engine's start up
+#is not charged to its first move
+HANDSHAKE = [("uci", "uciok"), ("ucinewgame\nisready", "readyok")]
+
+class UciProtocol:
+    def __init__(self, increment = 0):
+        self.buffer = MessageBuffer("newline")
+        self.increment = str(int(increment))
+        self.pondering = False
+        #Searches that were stopped, their bestmove is not an answer
+        self.stopped = 0
+
+    #A board message, a FEN followed by both clocks and maybe a ponder or
+    #ponderhit in front, as UCI commands
+    def translate(self, message):
+        if message == "stop":
+            if not self.pondering:
+                return []
+            self.pondering = False
+            self.stopped += 1
+            return ["stop"]
+        #UCI has no way to reject a move, the engine's clock just keeps running
+        if message == "ERROR":
+            return []
+        if message.startswith("ponderhit "):
+            self.pondering = False
+            return ["ponderhit"]
+        go = "go"
+        if message.startswith("ponder "):
+            message = message[len("ponder "):]
+            go = "go ponder"
+            self.pondering = True
+        fields = message.split()
+        return ["position fen " + " ".join(fields[:-2]),
+                go + " wtime " + fields[-2] + " btime " + fields[-1] + " winc " + self.increment + " binc " + self.increment]
+
+    def encode(self, messages):
+        lines = []
+        for message in messages:
+            lines += self.translate(message)
+        return encode_messages(lines)
+
+    #Moves in the board's form, "e2e4" or "e2e4 ponder e7e5"
+    def feed(self, data):
+        moves = []
+        for line in self.buffer.feed(data):
+            tokens = line.split()
+            if not tokens or tokens[0] != "bestmove":
+                continue
+            if self.stopped > 0:
+                self.stopped -= 1
+                continue
+            moves.append(" ".join(tokens[1:]))
+        return moves
@@ -0,0 +1,32 @@
+import random
+from .Constants import *
+
+#Fixed seed so keys are identical between runs and processes
+_random = random.Random(0x4B545547)
+
+PIECE_SQUARE = {piece: [_random.getrandbits(64) for sq in range(64)] for piece in letters}
+BLACK_TO_MOVE = _random.getrandbits(64)
+_castling_rights = [_random.getrandbits(64) for i in range(4)]
+EN_PASSANT_FILE = [_random.getrandbits(64) for file in range(8)]
+
+#Indexed by K + Q*2 + k*4 + q*8
+CASTLING = []
+for rights in range(16):
+    key = 0
+    for i in range(4):
+        if rights & (1 << i):
+            key ^= _castling_rights[i]
+    CASTLING.append(key)
+
+
+def castling_index(can_castle_king_white, can_castle_queen_white, can_castle_king_black, can_castle_queen_black):
+    return can_castle_king_white + can_castle_queen_white*2 + can_castle_king_black*4 + can_castle_queen_black*8
+
+#Side to move, castling and en passant part of the key, en_passant_file is -1
+#when there is no en passant capture available
+def state_key(white_to_move, castling, en_passant_file):
+    key = 0 if white_to_move else BLACK_TO_MOVE
+    key ^= CASTLING[castling_index(*castling)]
+    if en_passant_file != -1:
+        key ^= EN_PASSANT_FILE[en_passant_file]
+    return key
@@ -0,0 +1,42 @@
+#FEN encode/decode micro-benchmarks
+#Usage: python fenbench.py [--number N]
+import argparse
+import timeit
+from Chess import Fen
+from Chess.Position import Position
+from Chess.MoveHistory import BoardState
+from Chess.Perft import REFERENCE_POSITIONS
+
+
+def report(name, seconds, number):
+  print(name.ljust(40) + "{:8.2f}".format(seconds / number * 1000000) + " us  " + str(int(number / seconds)).rjust(9) + " /s")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="FEN codec micro-benchmarks")
+  parser.add_argument("--number", type=int, default=20000)
+  args = parser.parse_args()
+  number = args.number
+
+  fens = [fen for _, fen, _ in REFERENCE_POSITIONS]
+  position = Position(fens[1])
+  position.print_moves = False
+  move = position.get_legal_moves()[0]
+  mailbox = list(position.bitboard.mailbox)
+
+  benchmarks = [
+    ("decode", lambda: [Fen.decode(fen) for fen in fens], len(fens)),
+    ("BoardState parse", lambda: [BoardState(fen) for fen in fens], len(fens)),
+    ("encode placement from scratch", lambda: Fen.Placement(mailbox).get(), 1),
+    ("get_fen, position unchanged", position.get_fen, 1),
+    ("push + get_fen + pop", lambda: (position.push(move), position.get_fen(), position.pop()), 1),
+    ("push + pop", lambda: (position.push(move), position.pop()), 1),
+    ("generate_fen (wire format)", position.generate_fen, 1),
+  ]
+  for name, function, per_call in benchmarks:
+    seconds = timeit.timeit(function, number=number)
+    report(name, seconds, number * per_call)
+
+
+if __name__ == "__main__":
+  main()
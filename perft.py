@@ -0,0 +1,54 @@
+#Move generator benchmark and correctness check
+#Usage: python perft.py [depth] [--fen FEN] [--divide] [--suite] [--processes N]
+import argparse
+import sys
+from Chess.Perft import REFERENCE_POSITIONS, STARTING_FEN, format_move, divide, run_perft
+
+
+def report(nodes, seconds):
+  nps = int(nodes / seconds) if seconds > 0 else 0
+  print("Nodes: " + str(nodes) + "  Time: " + "{:0.3f}".format(seconds) + "s  NPS: " + str(nps))
+
+
+def run_divide(fen, depth, processes):
+  total = 0
+  for move, nodes in sorted(divide(fen, depth, processes), key=lambda entry: format_move(entry[0])):
+    print(format_move(move) + ": " + str(nodes))
+    total += nodes
+  print("Total: " + str(total))
+
+
+def run_suite(max_depth, processes):
+  failed = 0
+  for name, fen, counts in REFERENCE_POSITIONS:
+    for depth in range(1, min(max_depth, len(counts)) + 1):
+      nodes, seconds = run_perft(fen, depth, processes)
+      ok = nodes == counts[depth - 1]
+      if not ok:
+        failed += 1
+      print(name + " depth " + str(depth) + ": " + ("OK" if ok else "FAILED, expected " + str(counts[depth - 1])), end="  ")
+      report(nodes, seconds)
+  return failed
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Perft for the ChessBot move generator")
+  parser.add_argument("depth", type=int, nargs="?", default=3)
+  parser.add_argument("--fen", default=STARTING_FEN)
+  parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+  parser.add_argument("--suite", action="store_true", help="check the reference positions up to depth")
+  parser.add_argument("--processes", type=int, default=1, help="worker processes to split root moves over")
+  args = parser.parse_args()
+
+  if args.suite:
+    failed = run_suite(args.depth, args.processes)
+    print("All passed" if failed == 0 else str(failed) + " failed")
+    sys.exit(1 if failed else 0)
+  if args.divide:
+    run_divide(args.fen, args.depth, args.processes)
+  else:
+    report(*run_perft(args.fen, args.depth, args.processes))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,32 @@
+#Replays recorded games through the rules and checks their results still hold
+#Usage: python replay.py FILE [FILE ...] [--processes N]
+#Files can be PGN (.pgn), binary move logs (.log) or UCI move lists (anything
+#else, one "position startpos|fen FEN moves ... [result]" line per game)
+import argparse
+import sys
+from Chess.Replay import verify_files
+
+
+def print_file(path, games, moves, divergences):
+  print(path + ": " + str(games) + " games, " + str(moves) + " moves, " + str(len(divergences)) + " diverging")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Replay and verify recorded games")
+  parser.add_argument("files", nargs="+")
+  parser.add_argument("--processes", type=int, default=None, help="worker processes, defaults to the core count")
+  args = parser.parse_args()
+
+  games, moves, divergences, seconds = verify_files(args.files, args.processes, on_file=print_file)
+  print()
+  for divergence in divergences:
+    print(divergence.path + " game " + str(divergence.index) + " (" + divergence.white + " - " + divergence.black + "): " + divergence.message)
+  rate = games / seconds if seconds > 0 else 0
+  print(str(games) + " games, " + str(moves) + " moves in " + "{:0.2f}".format(seconds) + "s (" + "{:0.1f}".format(rate) + " games/s), "
+        + str(len(divergences)) + " diverging")
+  if divergences:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -1,52 +1,81 @@
 #Compile with: pyinstaller --onefile run.py --icon Assets/icon.png --name "ChessBot Board"
+#Run with --startup-profile to see where startup time goes
+import time
+startup_time = time.perf_counter()
 import os
-import select
 import sys
-import socket
+import select
+import threading
+import asyncio
 import pygame
+pygame_import_time = time.perf_counter()
 import configparser
-import re
 from pygame.locals import *
 from Chess.Board import Board
-
-
-
-white_sock = None
-black_sock = None
+from Chess.Position import Position
+from Chess.Engine import launch_pipe_engine, NativeProtocol
+from Chess.Arbiter import Arbiter, uci_handshake, make_protocol
+from Chess.Transport import PipeConnection, listen_engine, accept_engine, close_listener
+from Chess.Clock import now_ns, format_timings
+from Chess.GameRecord import RecordWriter
+from Chess.Startup import StartupProfile
+from Chess.Metrics import Metrics, MetricsExporter
+
+
+
+white_connection = None
+black_connection = None
+white_protocol = None
+black_protocol = None
+white_process = None
+black_process = None
 white_should_connect = True
 black_should_connect = True
-readable_sockets = []
-is_engine_thinking = False
+arbiter = None
+wake_event = None
 paused = False
+record_writer = None
+metrics = None
+metrics_exporter = None
 
 def handle_event(event):
   if event.type == QUIT:
-    try:
-      white_sock.close()
-    except:
-      pass
-    try:
-      black_sock.close()
-    except:
-      pass
+    for connection in (white_connection, black_connection):
+      try:
+        connection.close()
+      except:
+        pass
+    for process in (white_process, black_process):
+      try:
+        process.terminate()
+      except:
+        pass
+    if record_writer != None:
+      position.recorder.end(position.get_result(), position.status if position.is_game_ended() else "Aborted")
+      record_writer.close()
+    if metrics_exporter != None:
+      metrics_exporter.close()
     pygame.quit()
     sys.exit()
 
   if event.type == K_p:
     paused = not paused
-    if is_engine_thinking:
+    if arbiter.thinking:
       pass #can implement sending of stop/go commands
 
-  if is_engine_thinking:
+  if arbiter.thinking:
     pass
 
+  if event.type == VIDEOEXPOSE:
+    board.invalidate()
+
   if event.type == KEYDOWN:
     if event.key == K_RIGHT:
       board.key_right_event()
     if event.key == K_LEFT:
       board.key_left_event()
 
-  if board.is_game_ended():
+  if position.is_game_ended():
     return
   if event.type == MOUSEBUTTONDOWN:
     board.on_mouse_down_event()
@@ -54,117 +83,137 @@ def handle_event(event):
     board.on_mouse_up_event()
 
 
-pattern = re.compile("([a-h][1-8]){2}")
-def sanitize_input(input):
-  if len(input) != 4 and len(input) != 5:
-    return None
-  match = re.match(pattern, input)
-  if match == None:
-    return None
-  x1 = ord(input[0]) - ord('a')
-  y1 = 8 - int(input[1])
-  x2 = ord(input[2]) - ord('a')
-  y2 = 8 - int(input[3])
-  piece = ""
-  if len(input) == 5:
-    piece = input[4]
-    if "qnbr".count(piece) < 1:
-      return None
-  return [(x1, y1), (x2, y2), piece]
-  
-
-def send_error(is_white, received = "Unknown"):
-  message = "Received illegal request by "
-  message += "white" if is_white else "black"
-  message += "\nReceived message: " + received
-  print(message)
-  s_in.send(b'ERROR')
-
-
-def handle_request(s_in):
-  data = None
-  is_white = True if s_in == white_sock else False
-
-  if is_white == board.white_to_move:
-    board.stop_clock()
-
-  try:
-    data = s_in.recv(1024)
-  except:
-    print('Connection error')
-    return False
-
-  if data == None or data == b'':
-    return False
-
-  print("Received message from " + ("white: " if is_white else "black: ") + data.decode())
-
-  move = sanitize_input(data.decode())
-  if move == None:
-    send_error(is_white, data.decode())
-    return False
-
-  result = board.make_move(move[0], move[1], move[2])
-  if not result:
-    send_error(is_white, data.decode())
-  return result
+#Runs in a thread per engine and hands what it reads to the event loop. The
+#arrival is stamped here, as soon as select() sees the bytes, so the engine
+#is not charged for a frame the loop is busy drawing. b'' means the engine
+#is gone.
+def read_engine(connection, is_white, loop):
+  while True:
+    try:
+      select.select([connection], [], [])
+      received = now_ns()
+      data = connection.recv(4096)
+    except BlockingIOError:
+      continue
+    except (OSError, ValueError):
+      received = now_ns()
+      data = b''
+    loop.call_soon_threadsafe(on_engine_data, is_white, data, received)
+    if data == b'':
+      return
 
 
-def send_fen():
-  s_in = white_sock if board.white_to_move else black_sock
-  if s_in == None:
+#received is the monotonic_ns timestamp the data arrived at, the engine's
+#clock stops there
+def on_engine_data(is_white, data, received):
+  if data == b'':
+    print(("White" if is_white else "Black") + " disconnected")
     return
+  if arbiter.feed(is_white, data, received):
+    board.clear_selection()
+  #From the reply's arrival until the answer to it went out
+  if metrics != None:
+    metrics.observe("engine_reply", now_ns() - received)
+  wake_event.set()
+
+
+#Engines with a command are started by the board and talk over their stdin
+#and stdout, the others connect to port by themselves. Returns (connection,
+#protocol, process).
+def open_engine(name, command, uci, port):
+  if command:
+    print("Starting " + name + ": " + command)
+    process = launch_pipe_engine(command)
+    connection = PipeConnection(process)
+    #The engine's start up is not charged to its first move
+    if uci and not uci_handshake(connection, 10):
+      raise ConnectionError(name + " did not finish the UCI handshake")
+    return (connection, make_protocol(uci, framing, Position.increment), process)
+
+  print("Waiting for " + name + " to connect...")
+  listener, address = listen_engine(transport, port)
+  if transport != "tcp":
+    print("Listening on " + address)
+  try:
+    connection = accept_engine(listener, transport)
+  finally:
+    close_listener(listener)
+  return (connection, NativeProtocol(framing), None)
+
+
+#Runs function in a daemon thread, so an engine that never connects does not
+#keep the process alive on exit
+def in_thread(function, *args):
+  loop = asyncio.get_running_loop()
+  future = loop.create_future()
+  def run():
+    try:
+      result = function(*args)
+    except BaseException as e:
+      loop.call_soon_threadsafe(future.set_exception, e)
+    else:
+      loop.call_soon_threadsafe(future.set_result, result)
+  threading.Thread(target=run, daemon=True).start()
+  return future
 
-  print("Sending fen to " + "white" if s_in == white_sock else "black")
-  global is_engine_thinking
-  is_engine_thinking = True
-  fen = board.generate_fen()
-  s_in.send(fen.encode())
-
-
-def connect():
-  global white_should_connect
-  global black_should_connect
-  global white_sock
-  global black_sock
-  global readable_sockets
-
-  white_socket_connect = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-  black_socket_connect = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-  white_socket_connect.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-  black_socket_connect.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-  white_socket_connect.bind(('localhost',6969))
-  black_socket_connect.bind(('localhost',6970))
 
+async def connect():
+  global white_connection, white_protocol, white_process, white_should_connect
+  global black_connection, black_protocol, black_process, black_should_connect
+  sides = []
   if white_should_connect:
-    print("Waiting for white to connect...")
-    white_socket_connect.listen(1)
-    white_sock, _ = white_socket_connect.accept()
-    white_should_connect = False
-    print("White connected!")
+    sides.append((True, in_thread(open_engine, "white", white_command, white_uci, 6969)))
   if black_should_connect:
-    print("Waiting for black to connect...")
-    black_socket_connect.listen(1)
-    black_sock, _ = black_socket_connect.accept()
-    black_should_connect = False
-    print("Black connected!")
-
-  if white_sock != None:
-    white_sock.setblocking(0)
-    readable_sockets += [white_sock]
-  if black_sock != None:
-    black_sock.setblocking(0)
-    readable_sockets += [black_sock]
+    sides.append((False, in_thread(open_engine, "black", black_command, black_uci, 6970)))
+  for is_white, opening in sides:
+    engine = await opening
+    if is_white:
+      white_connection, white_protocol, white_process = engine
+      white_should_connect = False
+    else:
+      black_connection, black_protocol, black_process = engine
+      black_should_connect = False
+    print(("White" if is_white else "Black") + " connected!")
 
 
 default_position = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+#newline: messages end with \n, raw: one unterminated message per write
+framing = "newline"
+#How engines connect: tcp to ports 6969 and 6970, unix to a Unix domain
+#socket named after the port, shm meets on that socket and then passes
+#messages through shared memory
+transport = "tcp"
+#Game records, an empty name turns that record off
+pgn_file = "games.pgn"
+log_file = "games.log"
+#Hot path timings are written here every few seconds when set, as
+#Prometheus text if it ends in .prom and CSV otherwise
+metrics_file = ""
+#Engines are sent the position they expect while the opponent thinks
+ponder = False
+#Every move, message to or from an engine and FEN is printed to the console.
+#Off by default, printing runs between an engine's reply and the opponent's
+#clock starting.
+print_moves = False
+#An engine with a command is started by the board and talks over its stdin
+#and stdout instead of connecting to its port, with _Uci it speaks UCI
+white_command = ""
+black_command = ""
+white_uci = False
+black_uci = False
 
 def query_should_connect():
   global white_should_connect
   global black_should_connect
   global default_position
+  global framing
+  global transport
+  global pgn_file
+  global log_file
+  global metrics_file
+  global ponder
+  global print_moves
+  global white_command, black_command, white_uci, black_uci
   config = configparser.ConfigParser()
   should_always_ask = False
   try:
@@ -176,6 +225,21 @@ def query_should_connect():
       white_should_connect = config.getboolean("LAUNCH SETTINGS", "White_Is_Engine")
       black_should_connect = config.getboolean("LAUNCH SETTINGS", "Black_Is_Engine")
       default_position = config["LAUNCH SETTINGS"]["Default_Position"]
+      framing = config["LAUNCH SETTINGS"].get("Framing", framing)
+      transport = config["LAUNCH SETTINGS"].get("Transport", transport)
+      pgn_file = config["LAUNCH SETTINGS"].get("Pgn_File", pgn_file)
+      log_file = config["LAUNCH SETTINGS"].get("Log_File", log_file)
+      metrics_file = config["LAUNCH SETTINGS"].get("Metrics_File", metrics_file)
+      ponder = config["LAUNCH SETTINGS"].getboolean("Ponder", ponder)
+      print_moves = config["LAUNCH SETTINGS"].getboolean("Print_Moves", print_moves)
+      #Raw framing cannot tell a ponder message from the position after it
+      if ponder and framing == "raw":
+        print("Ponder needs newline framing, pondering is off")
+        ponder = False
+      white_command = config["LAUNCH SETTINGS"].get("White_Command", white_command)
+      black_command = config["LAUNCH SETTINGS"].get("Black_Command", black_command)
+      white_uci = config["LAUNCH SETTINGS"].getboolean("White_Uci", white_uci)
+      black_uci = config["LAUNCH SETTINGS"].getboolean("Black_Uci", black_uci)
       return
   except:
     pass
@@ -200,69 +264,154 @@ def query_should_connect():
   config["LAUNCH SETTINGS"] = {'White_Is_Engine': white_should_connect, 
                                'Black_Is_Engine': black_should_connect,
                                'Should_Always_Ask': should_always_ask,
-                               'Default_Position': "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"}
+                               'Default_Position': "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                               'Framing': framing,
+                               'Transport': transport,
+                               'Pgn_File': pgn_file,
+                               'Log_File': log_file,
+                               'Metrics_File': metrics_file,
+                               'Ponder': ponder,
+                               'Print_Moves': print_moves,
+                               'White_Command': white_command,
+                               'Black_Command': black_command,
+                               'White_Uci': white_uci,
+                               'Black_Uci': black_uci}
   with open("config.txt", 'w') as configfile:
     config.write(configfile)
 
 
-def init():
+async def init(profile):
   query_should_connect()
+  profile.mark("Config")
 
   try:   
-    connect()
+    await connect()
   except:
     print("Failed to connect engines")
     input()
     exit()
+  profile.mark("Waiting for engines")
 
 
-def render():
-  screen.fill((50, 50, 50))
-  pygame.display.set_caption(board.status)
-  screen.blit(board.render_board(), (0,0))
-  pygame.display.flip()
-  fpsClock.tick(fps)
-
-
-init()
-pygame.init()
- 
-fps = 144
-fpsClock = pygame.time.Clock()
- 
-width, height = 1085, 784
-screen = pygame.display.set_mode((width, height))
-pygame_icon = pygame.image.load("./Assets/icon.png")
-pygame.display.set_icon(pygame_icon)
-board = Board(width, height, default_position)
-
-print("Initializing game")
-render()
-print("Game starting!")
-
-while True:
-  for event in pygame.event.get():
-    handle_event(event)
-
-  ready_to_read = []
-  if readable_sockets != []:
-    ready_to_read, _, _ = select.select(readable_sockets, [], [], 0.01)
-
-  for s_in in ready_to_read:
-    result = handle_request(s_in)
-    if result:
-      is_engine_thinking = False
-    else:
-      board.start_clock()
-
-  if not is_engine_thinking and not board.is_clock_ticking:
-    board.start_clock()
-
-  if board.should_send_fen and not board.is_game_ended():
-    send_fen()
-    board.start_clock()
-    board.should_send_fen = False
+caption = None
 
-  board.tick_clock()
+def render():
+  global caption
+  if caption != position.status:
+    caption = position.status
+    pygame.display.set_caption(caption)
+  pygame.display.update(board.render_board(screen))
+
+
+#Full rate while a piece is dragged, a lower rate while a clock is running,
+#and only input polling otherwise
+drag_fps = 144
+clock_fps = 30
+idle_fps = 10
+
+def frame_interval():
+  if board.holding_piece:
+    return 1 / drag_fps
+  if position.is_clock_ticking:
+    return 1 / clock_fps
+  return 1 / idle_fps
+
+
+def start_metrics():
+  global metrics, metrics_exporter
+  metrics = Metrics()
+  metrics.instrument(position, ["make_move", "is_move_legal", "get_all_moves", "is_in_check", "generate_fen"])
+  metrics.instrument(board, ["render_board"])
+  arbiter.handle_message = metrics.wrap("handle_request", arbiter.handle_message)
+  metrics_exporter = MetricsExporter(metrics, metrics_file)
+
+
+async def main():
+  global screen, position, board, arbiter, wake_event, record_writer
+  profile = StartupProfile(startup_time)
+  profile.mark("Importing pygame", pygame_import_time)
+  profile.mark("Importing the rest")
+  await init(profile)
+  #Only the display is used, initializing every pygame module would also
+  #open the audio device
+  pygame.display.init()
+
+  width, height = 1085, 784
+  screen = pygame.display.set_mode((width, height))
+  pygame_icon = pygame.image.load("./Assets/icon.png")
+  pygame.display.set_icon(pygame_icon)
+  profile.mark("Display")
+  position = Position(default_position)
+  position.print_moves = print_moves
+  arbiter = Arbiter(position, ponder)
+  for is_white, connection, protocol in ((True, white_connection, white_protocol), (False, black_connection, black_protocol)):
+    if connection != None:
+      arbiter.add_engine(is_white, connection, protocol)
+  profile.mark("Position")
+  board = Board(width, height, position, profile)
+  profile.mark("Board")
+  if metrics_file:
+    start_metrics()
+  if pgn_file or log_file:
+    record_writer = RecordWriter(pgn_file, log_file)
+    position.recorder = record_writer.start_game("Engine" if white_connection != None else "Human",
+                                                 "Engine" if black_connection != None else "Human", default_position)
+  profile.mark("Game records")
+
+  wake_event = asyncio.Event()
+
+  print("Initializing game")
   render()
+  profile.mark("First frame")
+  if "--startup-profile" in sys.argv:
+    print(profile.report())
+  print("Game starting!")
+
+  loop = asyncio.get_running_loop()
+  for is_white, connection in ((True, white_connection), (False, black_connection)):
+    if connection != None:
+      threading.Thread(target=read_engine, args=(connection, is_white, loop), daemon=True).start()
+
+  was_active = True
+  timings_printed = False
+  while True:
+    frame_start = now_ns()
+    events = pygame.event.get()
+    for event in events:
+      handle_event(event)
+
+    #Engines get their position first, so their clock starts once it is out
+    arbiter.update()
+
+    if not arbiter.thinking and not position.is_clock_ticking and not position.is_game_ended():
+      position.start_clock()
+
+    position.tick_clock()
+    if position.is_game_ended() and not timings_printed:
+      timings_printed = True
+      print(position.status)
+      print(format_timings(position.clock.timings))
+      print(position.move_cache.stats())
+      arbiter.stop_pondering()
+      if record_writer != None:
+        position.recorder.end(position.get_result(), position.status)
+
+    #Nothing is drawn while the window is minimized or hidden, and once the
+    #game is over only input or an engine message causes a redraw
+    active = pygame.display.get_active()
+    if active and not was_active:
+      board.invalidate()
+    was_active = active
+    if active and (events or wake_event.is_set() or position.is_clock_ticking or board.holding_piece):
+      render()
+    if metrics != None:
+      metrics.observe("frame", now_ns() - frame_start)
+
+    wake_event.clear()
+    try:
+      await asyncio.wait_for(wake_event.wait(), frame_interval())
+    except asyncio.TimeoutError:
+      pass
+
 
+asyncio.run(main())
@@ -0,0 +1,68 @@
+#Plays a new engine against a base one until an SPRT decides whether it is stronger
+#Usage: python sprt.py -e NEW "COMMAND {port}" -e BASE "COMMAND {port}" [--elo0 0] [--elo1 5] [--alpha 0.05] [--beta 0.05]
+#                      [--max-games N] [--concurrency N] [--time MS] [--increment MS] [--fen FEN] [--framing newline|raw]
+#                      [--pgn FILE] [--log FILE] [--ponder] [--transport tcp|pipe|unix|shm] [--uci NAME]
+import argparse
+import sys
+from Chess.Constants import STARTING_FEN
+from Chess.Sprt import Sprt, run_sprt
+from Chess.Transport import TRANSPORTS
+
+
+def print_result(white, black, result, reason, sprt):
+  print(white + " - " + black + ": " + result + " (" + reason + ")   " + sprt.format())
+
+
+def main():
+  parser = argparse.ArgumentParser(description="SPRT match between a new engine and a base engine")
+  parser.add_argument("-e", "--engine", nargs=2, action="append", metavar=("NAME", "COMMAND"), required=True,
+                      help="the new engine first and the base engine second, {port} is replaced with the port to connect to")
+  parser.add_argument("--elo0", type=float, default=0, help="elo difference of the null hypothesis")
+  parser.add_argument("--elo1", type=float, default=5, help="elo difference of the alternative hypothesis")
+  parser.add_argument("--alpha", type=float, default=0.05, help="chance of accepting elo1 when elo0 is true")
+  parser.add_argument("--beta", type=float, default=0.05, help="chance of accepting elo0 when elo1 is true")
+  parser.add_argument("--max-games", type=int, default=100000, help="stop undecided after this many games")
+  parser.add_argument("--concurrency", type=int, default=None, help="games played at once, defaults to the core count")
+  parser.add_argument("--time", type=int, default=10*1000, help="milliseconds per side")
+  parser.add_argument("--increment", type=int, default=100, help="milliseconds added per move")
+  parser.add_argument("--fen", default=STARTING_FEN)
+  parser.add_argument("--framing", choices=["newline", "raw"], default="newline")
+  parser.add_argument("--transport", choices=TRANSPORTS, default="tcp")
+  parser.add_argument("--uci", action="append", default=[], metavar="NAME", help="this engine speaks UCI over its stdin and stdout")
+  parser.add_argument("--ponder", action="store_true")
+  parser.add_argument("--pgn", default=None, help="append finished games to this PGN file")
+  parser.add_argument("--log", default=None, help="append finished games to this binary move log")
+  args = parser.parse_args()
+  if args.ponder and args.framing == "raw":
+    parser.error("--ponder needs newline framing")
+
+  if len(args.engine) != 2 or args.engine[0][0] == args.engine[1][0]:
+    parser.error("exactly two engines with different names are needed")
+  if args.elo1 <= args.elo0:
+    parser.error("--elo1 has to be above --elo0")
+  writer = None
+  if args.pgn or args.log:
+    #Imported here so game worker processes started by spawn do not load it
+    from Chess.GameRecord import RecordWriter
+    writer = RecordWriter(args.pgn, args.log)
+  sprt = Sprt(args.elo0, args.elo1, args.alpha, args.beta)
+  try:
+    run_sprt(tuple(args.engine[0]), tuple(args.engine[1]), sprt, args.max_games, args.concurrency, args.fen, args.time, args.increment,
+             args.framing, on_result=print_result, writer=writer, ponder=args.ponder, transport=args.transport, uci=args.uci)
+  finally:
+    if writer != None:
+      writer.close()
+  print()
+  print(sprt.format())
+  result = sprt.result()
+  if result == "H1":
+    print(args.engine[0][0] + " is stronger, H1 (elo " + "{:g}".format(args.elo1) + ") accepted")
+  elif result == "H0":
+    print(args.engine[0][0] + " is not stronger, H0 (elo " + "{:g}".format(args.elo0) + ") accepted")
+  else:
+    print("Undecided after " + str(sprt.games()) + " games")
+    sys.exit(2)
+
+
+if __name__ == "__main__":
+  main()
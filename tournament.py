@@ -0,0 +1,63 @@
+#Runs many engine-vs-engine games at once without a window
+#Usage: python tournament.py -e NAME "COMMAND {port}" -e NAME "COMMAND {port}" [--scheme roundrobin|gauntlet]
+#                            [--rounds N] [--concurrency N] [--time MS] [--increment MS] [--fen FEN] [--framing newline|raw]
+#                            [--pgn FILE] [--log FILE] [--ponder] [--transport tcp|pipe|unix|shm] [--uci NAME]
+import argparse
+from Chess.Constants import STARTING_FEN
+from Chess.Clock import format_timings
+from Chess.Tournament import PAIRING_SCHEMES, run_tournament
+from Chess.Transport import TRANSPORTS
+
+
+def print_result(white, black, result, reason, timings):
+  print(white + " - " + black + ": " + result + " (" + reason + ")")
+  if timings:
+    print("  " + format_timings(timings).replace("\n", "\n  "))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Engine tournament for the ChessBot arbiter")
+  parser.add_argument("-e", "--engine", nargs=2, action="append", metavar=("NAME", "COMMAND"), required=True,
+                      help="engine name and command, {port} is replaced with the port to connect to")
+  parser.add_argument("--scheme", choices=PAIRING_SCHEMES.keys(), default="roundrobin")
+  parser.add_argument("--rounds", type=int, default=1)
+  parser.add_argument("--concurrency", type=int, default=None, help="games played at once, defaults to the core count")
+  parser.add_argument("--time", type=int, default=5*60*1000, help="milliseconds per side")
+  parser.add_argument("--increment", type=int, default=3000, help="milliseconds added per move")
+  parser.add_argument("--fen", default=STARTING_FEN)
+  parser.add_argument("--framing", choices=["newline", "raw"], default="newline",
+                      help="newline-terminated messages, or raw for engines that send one unterminated message per write")
+  parser.add_argument("--transport", choices=TRANSPORTS, default="tcp",
+                      help="how engines are talked to, {port} becomes a socket path with unix and shm")
+  parser.add_argument("--uci", action="append", default=[], metavar="NAME",
+                      help="this engine speaks UCI over its stdin and stdout, can be given several times")
+  parser.add_argument("--ponder", action="store_true", help="send engines the position they expect while the opponent thinks")
+  parser.add_argument("--pgn", default=None, help="append finished games to this PGN file")
+  parser.add_argument("--log", default=None, help="append finished games to this binary move log")
+  args = parser.parse_args()
+  if args.ponder and args.framing == "raw":
+    parser.error("--ponder needs newline framing")
+
+  if len(args.engine) < 2:
+    parser.error("at least two engines are needed")
+  for name in args.uci:
+    if name not in dict(args.engine):
+      parser.error("--uci names an unknown engine: " + name)
+  writer = None
+  if args.pgn or args.log:
+    #Imported here so game worker processes started by spawn do not load it
+    from Chess.GameRecord import RecordWriter
+    writer = RecordWriter(args.pgn, args.log)
+  try:
+    crosstable = run_tournament(args.engine, args.scheme, args.rounds, args.concurrency, args.fen,
+                                args.time, args.increment, args.framing, on_result=print_result, writer=writer, ponder=args.ponder,
+                                transport=args.transport, uci=args.uci)
+  finally:
+    if writer != None:
+      writer.close()
+  print()
+  print(crosstable.format())
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,99 @@
+#Round trip time of a position message through each engine transport
+#Usage: python transportbench.py [--number N] [--transport NAME ...]
+import argparse
+import os
+import select
+import socket
+import sys
+import time
+from Chess.Constants import STARTING_FEN
+from Chess.Engine import launch_engine, launch_pipe_engine, stop_engine
+from Chess.Transport import TRANSPORTS, PipeConnection, ShmConnection, socket_path, listen_unix, connect_engine
+
+
+#The engine side, answers every read with a move
+def echo(transport, address):
+  if transport == "pipe":
+    while True:
+      data = os.read(0, 4096)
+      if not data:
+        return
+      os.write(1, b"e2e4\n")
+  connection = connect_engine(transport, address)
+  while True:
+    select.select([connection], [], [])
+    try:
+      data = connection.recv(4096)
+    except BlockingIOError:
+      continue
+    if not data:
+      return
+    connection.sendall(b"e2e4\n")
+
+
+def connect(transport):
+  command = sys.executable + " " + os.path.abspath(__file__) + " --echo " + transport
+  if transport == "pipe":
+    process = launch_pipe_engine(command)
+    return (process, PipeConnection(process), None)
+  if transport == "tcp":
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('localhost', 0))
+    listener.listen(1)
+    address = listener.getsockname()[1]
+  else:
+    address = socket_path("bench-" + str(os.getpid()))
+    listener = listen_unix(address)
+  process = launch_engine(command, address)
+  connection, _ = listener.accept()
+  listener.close()
+  if transport == "tcp":
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    address = None
+  if transport == "shm":
+    connection = ShmConnection.serve(connection)
+  return (process, connection, address)
+
+
+def round_trips(connection, message, number):
+  times = []
+  for _ in range(number):
+    start = time.perf_counter_ns()
+    connection.sendall(message)
+    while True:
+      select.select([connection], [], [])
+      try:
+        if connection.recv(4096):
+          break
+      except BlockingIOError:
+        pass
+    times.append(time.perf_counter_ns() - start)
+  return sorted(times)
+
+
+def main():
+  if len(sys.argv) > 1 and sys.argv[1] == "--echo":
+    echo(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    return
+  parser = argparse.ArgumentParser(description="Engine transport round trip benchmark")
+  parser.add_argument("--number", type=int, default=20000)
+  parser.add_argument("--transport", action="append", choices=TRANSPORTS, help="defaults to every transport available here")
+  args = parser.parse_args()
+
+  message = (STARTING_FEN + " 300000 300000\n").encode()
+  for transport in args.transport or TRANSPORTS:
+    process, connection, path = connect(transport)
+    try:
+      round_trips(connection, message, args.number // 10)
+      times = round_trips(connection, message, args.number)
+    finally:
+      connection.close()
+      stop_engine(process)
+      if path != None:
+        os.unlink(path)
+    print(transport.ljust(8) + "p50 " + "{:7.1f}".format(times[len(times) // 2] / 1000) + " us  p99 "
+          + "{:7.1f}".format(times[len(times) * 99 // 100] / 1000) + " us  mean " + "{:7.1f}".format(sum(times) / len(times) / 1000) + " us")
+
+
+if __name__ == "__main__":
+  main()